@@ -1,38 +1,125 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_restful import Api
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, jwt_required
 from models import db
+from click_buffer import click_buffer
+from response_cache import response_cache
+from lockout import lockouts
+from password_hashing import hashing_pool
+from auth_cache import identity_cache
+from replicas import PRIMARY_HEADER, replicas
+from uploads import upload_store
+from images import image_pipeline
+from search_index import search_index
+from scheduling import scheduler
+from metrics import metrics
+from static_files import MediaWhiteNoise, build_static
 from resources.admin import auth_bp
 from resources.bookings import clicks_bp
 from resources.products import products_bp
 from resources.services import services_bp
 from resources.booking import booking_bp
+from resources.search import search_bp
+from resources.categories import categories_bp
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
-from whitenoise import WhiteNoise
 import os
+import click
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # Enable CORS for the app
-CORS(app)
+CORS(app, expose_headers=[PRIMARY_HEADER])  # Lets cross-origin clients read the replica pin (see replicas.py)
 
 # Flask app configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite')  # Use DATABASE_URL from environment
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# Connection pool settings; size the pool to the threads a worker runs (see gunicorn.conf.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True') == 'True',  # Drop connections the server closed
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),  # Seconds before a connection is replaced
+}
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+    })
+app.config['DATABASE_REPLICA_URLS'] = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]  # Read replicas for GET endpoints
+app.config['REPLICA_STICKY_SECONDS'] = float(os.getenv('REPLICA_STICKY_SECONDS', '5'))  # Reads stay on the primary this long after a client writes
+app.config['REPLICA_HEALTH_INTERVAL'] = float(os.getenv('REPLICA_HEALTH_INTERVAL', '10'))  # Seconds between replica checks / before retrying a failed one
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your_jwt_secret_key')  # Use JWT_SECRET_KEY from environment
-app.config['UPLOAD_FOLDER'] = 'uploads/products'
-app.config['UPLOAD_FOLDER_AFTER'] = 'uploads/after'
-app.wsgi_app = WhiteNoise(app.wsgi_app, root='static/')
+app.config['PROPAGATE_EXCEPTIONS'] = True  # Let flask-jwt-extended answer revoked/expired tokens with 401 instead of flask-restful's 500
+app.config['UPLOAD_ROOT'] = os.getenv('UPLOAD_ROOT', 'uploads')  # Content-addressed store for uploaded images
+app.config['UPLOAD_URL_PREFIX'] = os.getenv('UPLOAD_URL_PREFIX', '/uploads/')
+app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))  # Per file
+app.config['IMPORT_MAX_BYTES'] = int(os.getenv('IMPORT_MAX_BYTES', str(200 * 1024 * 1024)))  # Body limit for /products/import and /services/import
+app.config['IMPORT_BATCH_SIZE'] = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))  # Rows upserted per transaction
+app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', '1'))  # Processes per worker for thumbnails/variants (0 = inline)
+app.config['IMAGE_WIDTHS'] = [int(width) for width in os.getenv('IMAGE_WIDTHS', '160,320,640,1024').split(',')]
+app.config['IMAGE_FORMATS'] = os.getenv('IMAGE_FORMATS', 'avif,webp').split(',')
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', str(25 * 1024 * 1024)))  # Whole request; larger bodies get 413 before they are read
+app.config['BOOKING_SLOT_MINUTES'] = int(os.getenv('BOOKING_SLOT_MINUTES', '60'))  # Slot grid and default appointment length
+app.config['BOOKING_MAX_MINUTES'] = int(os.getenv('BOOKING_MAX_MINUTES', '480'))  # Longest allowed appointment; bounds the overlap scans
+app.config['BOOKING_OPEN_HOUR'] = int(os.getenv('BOOKING_OPEN_HOUR', '8'))  # Opening hours offered by the availability endpoints
+app.config['BOOKING_CLOSE_HOUR'] = int(os.getenv('BOOKING_CLOSE_HOUR', '18'))
+app.config['BOOKING_HORIZON_DAYS'] = int(os.getenv('BOOKING_HORIZON_DAYS', '90'))  # How far ahead next-slot looks
+app.config['BOOKING_TIMEZONE'] = os.getenv('BOOKING_TIMEZONE', 'UTC')  # Appointment times and opening hours are wall-clock times here
+app.config['BOOKING_BATCH_MAX'] = int(os.getenv('BOOKING_BATCH_MAX', '5000'))  # Updates per PATCH /bookings/batch
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'True') == 'True'  # Request/SQL instrumentation served at /metrics
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # When set, /metrics requires "Authorization: Bearer <token>"
+app.config['METRICS_DIR'] = os.getenv('METRICS_DIR')  # Shared by the workers of a host so /metrics reports all of them
+app.config['METRICS_WRITE_INTERVAL'] = float(os.getenv('METRICS_WRITE_INTERVAL', '5'))  # Seconds between a worker's snapshots in METRICS_DIR
+app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', '1000'))  # Requests at least this slow are logged with their slowest SQL
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', '200'))
+app.config['CLICK_FLUSH_INTERVAL'] = float(os.getenv('CLICK_FLUSH_INTERVAL', '5'))  # Seconds between click flushes (0 = write-through)
+app.config['CLICK_FLUSH_THRESHOLD'] = int(os.getenv('CLICK_FLUSH_THRESHOLD', '500'))  # Flush early once this many clicks are pending
+app.config['CLICK_ROLLUP_INTERVAL'] = float(os.getenv('CLICK_ROLLUP_INTERVAL', '60'))  # Seconds between click rollups (0 = only via `flask rollup-clicks`)
+app.config['CLICK_EVENT_RETENTION_DAYS'] = int(os.getenv('CLICK_EVENT_RETENTION_DAYS', '90'))
+app.config['CACHE_DEFAULT_TTL'] = int(os.getenv('CACHE_DEFAULT_TTL', '30'))  # Seconds; 0 disables the response cache
+app.config['CACHE_MAX_ENTRIES'] = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL')  # Share the cache between workers
+app.config['LOCKOUT_BACKEND'] = os.getenv('LOCKOUT_BACKEND', 'memory')  # memory, sqlite (one host) or redis
+app.config['LOCKOUT_SQLITE_PATH'] = os.getenv('LOCKOUT_SQLITE_PATH', 'lockouts.sqlite')
+app.config['LOCKOUT_REDIS_URL'] = os.getenv('LOCKOUT_REDIS_URL', os.getenv('CACHE_REDIS_URL'))
+app.config['LOCKOUT_MAX_ATTEMPTS'] = int(os.getenv('LOCKOUT_MAX_ATTEMPTS', '5'))
+app.config['LOCKOUT_SECONDS'] = int(os.getenv('LOCKOUT_SECONDS', '900'))
+app.config['LOCKOUT_MAX_KEYS'] = int(os.getenv('LOCKOUT_MAX_KEYS', '100000'))  # Bound for the in-memory backend
+app.config['HASH_POOL_WORKERS'] = int(os.getenv('HASH_POOL_WORKERS', '2'))  # Processes per worker for password hashing (0 = inline)
+app.config['HASH_POOL_MAX_PENDING'] = int(os.getenv('HASH_POOL_MAX_PENDING', '8'))  # Queued hashes before logins get a 503
+app.config['HASH_TIMEOUT'] = float(os.getenv('HASH_TIMEOUT', '10'))
+app.config['IDENTITY_CACHE_TTL'] = int(os.getenv('IDENTITY_CACHE_TTL', '300'))  # Seconds an admin record stays cached
+app.config['REVOCATION_REFRESH_SECONDS'] = float(os.getenv('REVOCATION_REFRESH_SECONDS', '5'))  # How often workers pull new revocations
+app.config['STATIC_ROOT'] = os.getenv('STATIC_ROOT', 'static/')
+app.config['STATIC_MAX_AGE'] = int(os.getenv('STATIC_MAX_AGE', '60'))  # Seconds for unhashed static names; uploads and hashed names are immutable
+# Serve static files and uploads before the request reaches Flask
+app.wsgi_app = MediaWhiteNoise(
+    app.wsgi_app,
+    root=app.config['STATIC_ROOT'],
+    upload_root=app.config['UPLOAD_ROOT'],
+    upload_prefix=app.config['UPLOAD_URL_PREFIX'],
+    max_age=app.config['STATIC_MAX_AGE'],
+)
 
 # Initialize extensions
+metrics.init_app(app)  # First, so its timing wraps the other extensions' request hooks
 db.init_app(app)
-migrate = Migrate(app, db)
+replicas.init_app(app)
+upload_store.init_app(app)
+image_pipeline.init_app(app)
+scheduler.init_app(app)
+migrate = Migrate(app, db, include_object=search_index.include_object)
 jwt = JWTManager(app)
+click_buffer.init_app(app)
+response_cache.init_app(app)
+lockouts.init_app(app)
+hashing_pool.init_app(app)
+identity_cache.init_app(app, jwt)
 
 # Initialize Flask-Limiter
 limiter = Limiter(
@@ -50,6 +137,8 @@ app.register_blueprint(clicks_bp)
 app.register_blueprint(products_bp)
 app.register_blueprint(services_bp)
 app.register_blueprint(booking_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(categories_bp)
 
 # Create API instance
 api = Api(app)
@@ -58,6 +147,58 @@ api = Api(app)
 def hello():
     return jsonify(message="Hello from Flask!")
 
+@app.route('/cache/stats')
+@jwt_required()
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify(message="Unauthorized"), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('rollup-clicks')
+def rollup_clicks_command():
+    """Flush buffered clicks and roll the click event log up into hourly/daily buckets."""
+    click_buffer.flush()
+    click_buffer.rollup()
+
+@app.cli.command('process-images')
+def process_images_command():
+    """Create thumbnails and WebP/AVIF variants for uploaded images that have none yet."""
+    click.echo(f"Processed {image_pipeline.backfill()} images")
+
+@app.cli.command('build-static')
+def build_static_command():
+    """Write hashed, precompressed copies of the static files and their manifest."""
+    manifest = build_static(app.config['STATIC_ROOT'])
+    click.echo(f"Built {len(manifest)} static files")
+
+@app.cli.command('search-reindex')
+def search_reindex_command():
+    """Rebuild the full-text search index from the products and services tables."""
+    search_index.rebuild()
+    click.echo("Rebuilt the search index")
+
+@app.cli.command('seed')
+@click.option('--products', default=10000, help='Products to generate.')
+@click.option('--services', default=2000, help='Services to generate.')
+@click.option('--bookings', default=50000, help='Bookings to generate (needs products or services).')
+@click.option('--clicks', default=100000, help='Click events to generate (needs products or services).')
+@click.option('--seed', default=42, help='RNG seed; the same seed gives the same data.')
+@click.option('--batch-size', default=20000, help='Rows per INSERT batch and transaction.')
+def seed_command(products, services, bookings, clicks, seed, batch_size):
+    """Bulk-generate a reproducible synthetic dataset for development and load tests."""
+    from data import Seeder  # Faker is only needed for seeding
+
+    seeder = Seeder(seed, batch_size)
+    for name, count in (('products', products), ('services', services), ('bookings', bookings), ('clicks', clicks)):
+        if count:
+            rate = getattr(seeder, name)(count)
+            click.echo(f"Seeded {count} {name} ({rate:,.0f} rows/sec)")
+
 # Run locally
 if __name__ == '__main__':
     app.run(debug=os.getenv('FLASK_DEBUG', 'True') == 'True')
@@ -0,0 +1,160 @@
+import calendar
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from models import db, Admin, TokenRevocation
+from response_cache import MemoryBackend
+
+
+class IdentityCache:
+    """Caches admin records for JWT-protected routes and keeps the token revocation list in memory.
+
+    Revocations live in the token_revocations table; each worker pulls rows it
+    has not seen yet at most every REVOCATION_REFRESH_SECONDS, so checking a
+    token is two dict lookups and no query. Admin records are cached for
+    IDENTITY_CACHE_TTL seconds and dropped as soon as the admin is updated or
+    deleted in this worker.
+    """
+
+    def __init__(self, app=None, jwt=None):
+        self.admins = MemoryBackend(max_entries=1024)
+        self.admin_ttl = 300
+        self.refresh_interval = 5.0
+        self.token_lifetime = timedelta(days=30)
+        self._revoked_jtis = {}  # jti -> expires_at
+        self._revoked_admins = {}  # admin id -> (revoked_before epoch seconds, expires_at)
+        self._last_revocation_id = 0
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt):
+        self.admin_ttl = int(app.config.get('IDENTITY_CACHE_TTL', self.admin_ttl))
+        self.refresh_interval = float(app.config.get('REVOCATION_REFRESH_SECONDS', self.refresh_interval))
+        self.token_lifetime = app.config.get('JWT_REFRESH_TOKEN_EXPIRES') or self.token_lifetime
+        jwt.token_in_blocklist_loader(self.is_revoked)
+        jwt.user_lookup_loader(self.lookup_admin)
+        app.extensions['identity_cache'] = self
+
+    # Revocation list
+
+    def is_revoked(self, jwt_header, jwt_payload):
+        self._refresh_revocations()
+        if jwt_payload.get('jti') in self._revoked_jtis:
+            return True
+        revoked = self._revoked_admins.get(str(jwt_payload.get('sub')))
+        # A token issued in the same second as the revocation is revoked too
+        return revoked is not None and jwt_payload.get('iat', 0) <= revoked[0]
+
+    def revoke_token(self, jti, expires_at):
+        """Revoke one token (e.g. on logout); the caller commits."""
+        db.session.add(TokenRevocation(jti=jti, expires_at=expires_at))
+        self._pending(db.session).append(('jti', jti, expires_at))
+
+    def revoke_admin(self, admin_id, connection=None):
+        """Revoke every token issued to an admin until now and drop the cached record."""
+        now = datetime.utcnow()
+        expires_at = now + self.token_lifetime
+        values = {'admin_id': admin_id, 'revoked_at': now, 'expires_at': expires_at}
+        if connection is not None:
+            connection.execute(TokenRevocation.__table__.insert().values(**values))
+        else:
+            db.session.add(TokenRevocation(**values))
+        self._pending(db.session).append(('admin', str(admin_id), (_epoch(now), expires_at)))
+        self.admins.bump(f"admin:{admin_id}")
+
+    @staticmethod
+    def _pending(session):
+        # Revocations of the open transaction; they reach the in-memory lists only once it commits
+        return session.info.setdefault('pending_revocations', [])
+
+    def _apply(self, revocations):
+        for kind, key, value in revocations:
+            if kind == 'jti':
+                self._revoked_jtis[key] = value
+            else:
+                current = self._revoked_admins.get(key)
+                if current is None or current[0] < value[0]:
+                    self._revoked_admins[key] = value
+
+    def _refresh_revocations(self):
+        if time.monotonic() < self._next_refresh:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_refresh:
+                return
+            self._next_refresh = time.monotonic() + self.refresh_interval
+            now = datetime.utcnow()
+            rows = (
+                db.session.query(TokenRevocation)
+                .filter(TokenRevocation.id > self._last_revocation_id, TokenRevocation.expires_at > now)
+                .order_by(TokenRevocation.id)
+                .all()
+            )
+            for row in rows:
+                if row.jti:
+                    self._revoked_jtis[row.jti] = row.expires_at
+                if row.admin_id is not None:
+                    revoked_before = _epoch(row.revoked_at)
+                    current = self._revoked_admins.get(str(row.admin_id))
+                    if current is None or current[0] < revoked_before:
+                        self._revoked_admins[str(row.admin_id)] = (revoked_before, row.expires_at)
+            if rows:
+                self._last_revocation_id = rows[-1].id
+            # Forget revocations whose tokens have expired on their own
+            self._revoked_jtis = {jti: expiry for jti, expiry in self._revoked_jtis.items() if expiry > now}
+            self._revoked_admins = {id: entry for id, entry in self._revoked_admins.items() if entry[1] > now}
+
+    # Admin records
+
+    def lookup_admin(self, jwt_header, jwt_data):
+        admin_id = jwt_data.get('sub')
+        generation = self.admins.generations([f"admin:{admin_id}"])[0]
+        key = f"admin|admin:{admin_id}:{generation}"
+        cached = self.admins.get(key)
+        if cached is not None:
+            return cached
+        admin = db.session.get(Admin, int(admin_id)) if str(admin_id).isdigit() else None
+        if admin is None:
+            return None
+        record = admin.to_dict()
+        self.admins.set(key, record, self.admin_ttl)
+        return record
+
+
+def _epoch(moment):
+    # Epoch seconds of a naive UTC datetime; .timestamp() would read it as local time
+    return calendar.timegm(moment.utctimetuple())
+
+
+identity_cache = IdentityCache()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _revocations_committed(session):
+    identity_cache._apply(session.info.pop('pending_revocations', []))
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _revocations_discarded(session, transaction):
+    # Rolled back or closed without a commit: the revocations never happened
+    if transaction.parent is None:
+        session.info.pop('pending_revocations', None)
+
+
+@event.listens_for(Admin, 'after_update')
+def _admin_updated(mapper, connection, target):
+    if target.__dict__.pop('_password_rehash', False):
+        identity_cache.admins.bump(f"admin:{target.id}")
+        return
+    if inspect(target).attrs.password_hash.history.has_changes():
+        identity_cache.revoke_admin(target.id, connection)
+    else:
+        identity_cache.admins.bump(f"admin:{target.id}")
+
+
+@event.listens_for(Admin, 'after_delete')
+def _admin_deleted(mapper, connection, target):
+    identity_cache.revoke_admin(target.id, connection)
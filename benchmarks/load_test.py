@@ -0,0 +1,126 @@
+"""HTTP load test comparing gunicorn worker modes on the catalog and booking endpoints.
+
+Usage:
+    python benchmarks/load_test.py [--seconds 10] [--clients 32] [--modes sync,gthread]
+
+For each mode it starts `gunicorn -c gunicorn.conf.py app:app` on a fresh
+SQLite database seeded with 2,000 products and 5,000 bookings, then keeps
+`--clients` keep-alive connections busy for `--seconds` per endpoint:
+
+    GET  /products?limit=50
+    GET  /products/bookings?limit=50
+    POST /products/<id>/clicks
+
+and prints requests/sec and p50/p99 latency. Point DATABASE_URL at a
+Postgres instance to include real network round-trips, which is where
+gthread workers gain the most over sync ones.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HEADERS = {'X-Forwarded-Proto': 'https', 'Content-Type': 'application/json'}  # Talisman redirects plain http
+
+
+def seed(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    from app import app
+    from models import db, Product, Booking
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.bulk_insert_mappings(Product, [
+            {'name': f'Product {i}', 'category_name': f'cat{i % 10}', 'subcategory_name': f'sub{i % 50}',
+             'description': 'Load test product', 'price': float(i % 500), 'clicks': 0}
+            for i in range(1, 2001)
+        ])
+        db.session.bulk_insert_mappings(Booking, [
+            {'product_id': random.randint(1, 2000), 'name': 'Load', 'phone': '0700000000', 'message': 'hi', 'status': 'pending'}
+            for _ in range(5000)
+        ])
+        db.session.commit()
+
+
+def hammer(port, method, path, body, seconds, clients):
+    latencies = []
+    errors = [0]
+    deadline = time.monotonic() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request(method, path() if callable(path) else path, body=body, headers=HEADERS)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors[0] += 1
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - started)
+        conn.close()
+
+    workers = [threading.Thread(target=client) for _ in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    latencies.sort()
+    return {
+        'req/s': round(len(latencies) / seconds, 1),
+        'p50 ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p99 ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1) if latencies else None,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--modes', default='sync,gthread')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    booking = json.dumps({'name': 'Load', 'phone': '0700000000', 'message': 'hi'})
+    endpoints = [
+        ('GET /products', 'GET', '/products?limit=50', None),
+        ('GET /products/bookings', 'GET', '/products/bookings?limit=50', None),
+        ('POST /products/<id>/clicks', 'POST', lambda: f'/products/{random.randint(1, 2000)}/clicks', booking),
+    ]
+
+    for mode in args.modes.split(','):
+        database_url = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.sqlite')}"
+        seed(database_url)
+        env = dict(os.environ, DATABASE_URL=database_url, PORT=str(args.port), GUNICORN_WORKER_CLASS=mode,
+                   GUNICORN_ACCESS_LOG='/dev/null', CACHE_DEFAULT_TTL='0')
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                  cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            time.sleep(3)
+            for label, method, path, body in endpoints:
+                print(f"{mode:>8} {label:<28} {hammer(args.port, method, path, body, args.seconds, args.clients)}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Login throughput under concurrent load, with and without the hashing pool.
+
+Usage:
+    python benchmarks/login_throughput.py [--threads 16] [--logins 200] [--pool-workers 2]
+
+Runs against a throwaway SQLite database through the Flask test client.
+Reports logins/sec, how many logins were shed with 503, and the latency
+of catalog requests (GET /products) issued while the login burst runs.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(app, threads, logins):
+    from models import db, Admin
+    from password_hashing import hash_password
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Admin(name='bench', email='bench@example.com', password_hash=hash_password('secret')))
+        db.session.commit()
+
+    client = app.test_client()
+    base = {'base_url': 'https://localhost'}
+    statuses = []
+    catalog_latencies = []
+    done = threading.Event()
+
+    def login(_):
+        response = client.post('/login', json={'email': 'bench@example.com', 'password': 'secret'}, **base)
+        statuses.append(response.status_code)
+
+    def poll_catalog():
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/products', **base)
+            catalog_latencies.append(time.perf_counter() - started)
+
+    poller = threading.Thread(target=poll_catalog)
+    poller.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    poller.join()
+
+    ok = statuses.count(200)
+    return {
+        'logins/sec': round(ok / elapsed, 1),
+        'ok': ok,
+        'shed (503)': statuses.count(503),
+        'catalog p50 ms': round(statistics.median(catalog_latencies) * 1000, 1) if catalog_latencies else None,
+        'catalog max ms': round(max(catalog_latencies) * 1000, 1) if catalog_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.sqlite')}")
+    os.environ['LOCKOUT_MAX_ATTEMPTS'] = str(args.logins * 10)
+    from app import app
+    from password_hashing import hashing_pool
+
+    for label, workers in (('inline', 0), (f'pool x{args.pool_workers}', args.pool_workers)):
+        hashing_pool.workers = workers
+        print(f"{label:>10}: {run(app, args.threads, args.logins)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+from flask import current_app
+from sqlalchemy import case, literal
+from models import db, Booking
+from scheduling import scheduler
+
+BOOKING_STATUSES = ('pending', 'confirmed', 'cancelled')
+
+# Fields a batch item may set, besides its id
+BATCH_FIELDS = ('status', 'appointment', 'amount_paid')
+
+# Ids per SELECT/UPDATE statement; keeps every statement well under the bind parameter limits
+CHUNK_SIZE = 500
+
+
+class BatchItemError(Exception):
+    """Raised while validating one batch item; the item is reported and skipped."""
+
+
+def _chunks(ids):
+    for offset in range(0, len(ids), CHUNK_SIZE):
+        yield ids[offset:offset + CHUNK_SIZE]
+
+
+def _blocks(status, start):
+    # Same rule as Scheduler: an appointment blocks its slot unless the booking is cancelled
+    return start is not None and status != 'cancelled'
+
+
+class BookingBatch:
+    """Validates a list of booking updates and applies the valid ones with set-based UPDATEs.
+
+    The current rows are read with one SELECT per chunk of ids. Every field
+    is then written with one `UPDATE ... SET field = CASE id WHEN ... END`
+    per chunk, all in one transaction. Items are checked in order. A service
+    booking that is moved or reinstated must not overlap a booking in the
+    database or an earlier item of the same batch. Invalid items are
+    reported per id and left unchanged.
+    """
+
+    def __init__(self, updates):
+        self.updates = updates
+        self.results = []
+        self.changes = {}  # id -> {column: value} of the items that passed
+        self._current = {}
+        self._moved = {}  # id -> (service_id, start, end, blocks) once an item changes its slot
+
+    def _load(self, ids):
+        for chunk in _chunks(ids):
+            rows = db.session.query(
+                Booking.id, Booking.service_id, Booking.status, Booking.appointment_start, Booking.appointment_end,
+            ).filter(Booking.id.in_(chunk))
+            self._current.update((row.id, row) for row in rows)
+
+    def _values(self, item, current):
+        values = {}
+        if 'status' in item:
+            if item['status'] not in BOOKING_STATUSES:
+                raise BatchItemError(f"status must be one of {', '.join(BOOKING_STATUSES)}")
+            values['status'] = item['status']
+
+        if 'amount_paid' in item:
+            amount = item['amount_paid']
+            if amount is not None:
+                try:
+                    amount = str(float(amount))  # Stored as text, the way the create endpoints store it
+                except (TypeError, ValueError):
+                    raise BatchItemError("amount_paid must be a number")
+            values['amount_paid'] = amount
+
+        if 'appointment' in item:
+            appointment = item['appointment']
+            start = end = None
+            if appointment is not None:
+                if not isinstance(appointment, str) or len(appointment) > Booking.appointment.type.length:
+                    raise BatchItemError(f"appointment must be a string of at most {Booking.appointment.type.length} characters")
+                duration = item.get('duration')
+                if duration is not None and not isinstance(duration, int):
+                    raise BatchItemError("duration must be a number of minutes")
+                try:
+                    start, end = scheduler.interval(appointment, duration)
+                except ValueError as e:
+                    if current.service_id is not None:
+                        raise BatchItemError(str(e))
+                    # Product bookings keep accepting free text
+            values.update(appointment=appointment, appointment_start=start, appointment_end=end)
+
+        if not values:
+            raise BatchItemError(f"Nothing to update; send any of {', '.join(BATCH_FIELDS)}")
+        return values
+
+    def _clashes(self, id, service_id, start, end):
+        """Bookings the new slot of `id` would overlap, seen as the batch leaves them so far."""
+        clashes = [other for other in scheduler.conflicts(service_id, start, end, exclude=id, limit=None) if other not in self._moved]
+        clashes += [
+            other for other, (other_service, other_start, other_end, blocks) in self._moved.items()
+            if blocks and other != id and other_service == service_id and other_start < end and other_end > start
+        ]
+        return clashes
+
+    def _check(self, item):
+        id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(id, int) or isinstance(id, bool):
+            raise BatchItemError("Each update needs an integer id")
+        if id in self.changes:
+            raise BatchItemError("Duplicate id in this batch")
+        current = self._current.get(id)
+        if current is None:
+            raise BatchItemError("Booking not found")
+        values = self._values(item, current)
+
+        status = values.get('status', current.status)
+        start = values.get('appointment_start', current.appointment_start)
+        end = values.get('appointment_end', current.appointment_end)
+        blocks, blocked = _blocks(status, start), _blocks(current.status, current.appointment_start)
+        moved = (start, end) != (current.appointment_start, current.appointment_end)
+        if current.service_id is not None and blocks and (moved or not blocked):
+            clashes = self._clashes(id, current.service_id, start, end)
+            if clashes:
+                raise BatchItemError("The service is already booked at that time", clashes)
+        if moved or blocks != blocked:
+            self._moved[id] = (current.service_id, start, end, blocks)
+        return id, values
+
+    def validate(self):
+        ids = [item['id'] for item in self.updates if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        self._load(list(dict.fromkeys(ids)))
+        services = {row.service_id for row in self._current.values() if row.service_id is not None}
+        if services:
+            scheduler.lock(*services)
+        for item in self.updates:
+            try:
+                id, values = self._check(item)
+            except BatchItemError as e:
+                result = {"id": item.get('id') if isinstance(item, dict) else None, "ok": False, "error": e.args[0]}
+                if len(e.args) > 1:
+                    result["conflicts"] = e.args[1]
+                self.results.append(result)
+                continue
+            self.changes[id] = values
+            self.results.append({"id": id, "ok": True})
+
+    def apply(self):
+        """Write the validated changes, one CASE-based UPDATE per chunk of ids (commit is up to the caller)."""
+        table = Booking.__table__
+        ids = list(self.changes)
+        for chunk in _chunks(ids):
+            assignments = {}
+            for field in ('status', 'amount_paid', 'appointment', 'appointment_start', 'appointment_end'):
+                column = table.c[field]
+                whens = {id: literal(self.changes[id][field], column.type) for id in chunk if field in self.changes[id]}
+                if whens:
+                    assignments[column] = case(whens, value=table.c.id, else_=column)
+            db.session.execute(table.update().where(table.c.id.in_(chunk)).values(assignments))
+
+    def summary(self):
+        updated = len(self.changes)
+        return {"updated": updated, "failed": len(self.results) - updated, "results": self.results}
+
+
+def update_bookings(body):
+    """Apply a {"updates": [...]} request body in one transaction; returns (summary, status)."""
+    updates = body.get('updates') if isinstance(body, dict) else None
+    if not isinstance(updates, list) or not updates:
+        return {"error": "Send {\"updates\": [{\"id\": ..., \"status\": ...}, ...]}"}, 400
+    limit = int(current_app.config.get('BOOKING_BATCH_MAX', 5000))
+    if len(updates) > limit:
+        return {"error": f"At most {limit} updates per request"}, 400
+
+    batch = BookingBatch(updates)
+    try:
+        batch.validate()
+        batch.apply()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return batch.summary(), 200
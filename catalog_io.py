@@ -0,0 +1,225 @@
+import csv
+import io
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import Float
+from sqlalchemy.exc import SQLAlchemyError
+from db_utils import upsert
+from models import db, Product, Service
+from catalog_version import bump_catalog_version
+from response_cache import response_cache
+from search_index import search_index
+from taxonomy import move_category_counts, resolve_categories
+from serializers import loads
+from streaming import stream_items
+
+CATALOG_MODELS = {'products': Product, 'services': Service}
+
+# Columns accepted by the importers, in export order (after id); unknown columns are ignored
+IMPORT_FIELDS = {
+    'products': ('name', 'description', 'category_name', 'subcategory_name', 'price', 'image_url'),
+    'services': ('name', 'description', 'price', 'category_name', 'subcategory_name', 'before_service_image', 'after_service_image'),
+}
+
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+
+
+class ImportFormatError(Exception):
+    """Raised when an import body cannot be read at all (wrong type, missing CSV columns)."""
+
+
+def validate_row(table, fields, raw):
+    """Coerce one incoming record against the table's columns; returns (row, None) or (None, error).
+
+    Optional fields the record does not carry at all (no CSV column, no NDJSON
+    key) are left out of the row, so an upsert keeps their stored values.
+    """
+    if not isinstance(raw, dict):
+        return None, "Expected an object"
+    row = {}
+    for field in fields:
+        column = table.c[field]
+        if field not in raw and column.nullable:
+            continue
+        value = raw.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            if not column.nullable:
+                return None, f"{field} is required"
+            row[field] = None
+        elif isinstance(column.type, Float):
+            try:
+                row[field] = float(value)
+            except (TypeError, ValueError):
+                return None, f"{field} must be a number"
+        else:
+            value = str(value)
+            if column.type.length and len(value) > column.type.length:
+                return None, f"{field} is longer than {column.type.length} characters"
+            row[field] = value
+    return row, None
+
+
+def _csv_records(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if reader.fieldnames is None or 'name' not in reader.fieldnames:
+        raise ImportFormatError("CSV header must include a name column")
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _ndjson_records(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def _records():
+    kind = request.args.get('format') or request.mimetype
+    if kind in ('csv',) + CSV_MIMETYPES:
+        return _csv_records(request.stream)
+    if kind in ('ndjson',) + NDJSON_MIMETYPES:
+        return _ndjson_records(request.stream)
+    raise ImportFormatError("Send the catalog as text/csv or application/x-ndjson")
+
+
+class CatalogImport:
+    """Upserts validated rows by name, one transaction per batch, collecting per-row errors."""
+
+    def __init__(self, kind, batch_size, max_errors):
+        self.kind = kind
+        self.table = CATALOG_MODELS[kind].__table__
+        self.fields = IMPORT_FIELDS[kind]
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.processed = 0
+        self.upserted = 0
+        self.failed = 0
+        self.errors = []
+        self._batch = {}  # name -> (line, row); a name repeated within a batch keeps its last row
+
+    def error(self, line, name, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "name": name, "error": message})
+
+    def add(self, line, raw):
+        self.processed += 1
+        if raw is None:
+            self.error(line, None, "Invalid JSON")
+            return
+        row, message = validate_row(self.table, self.fields, raw)
+        if message:
+            self.error(line, raw.get('name') if isinstance(raw, dict) else None, message)
+            return
+        self._batch[row['name']] = (line, row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _upsert(self, rows):
+        table = self.table
+        names = [row['name'] for row in rows]
+        nodes = resolve_categories((row['category_name'], row['subcategory_name']) for row in rows)
+        for row in rows:
+            row['category_id'], row['subcategory_id'] = nodes[(row['category_name'], row['subcategory_name'])]
+        # Subcategory of each row that already exists, so only real moves touch the counts
+        previous = dict(db.session.query(table.c.name, table.c.subcategory_id).filter(table.c.name.in_(names)))
+
+        # One statement per set of fields present, so a field a record leaves out is never overwritten
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+        for present, group in groups.items():
+            set_ = {
+                field: (lambda excluded, field=field: getattr(excluded, field))
+                for field in present if field != 'name'
+            }
+            set_['version'] = lambda excluded: table.c.version + 1  # ON CONFLICT updates skip column onupdate
+            upsert(table, group, ['name'], set_)
+        move_category_counts(self.kind, [(previous.get(row['name']), row['subcategory_id']) for row in rows])
+        search_index.refresh(self.kind, table.c.name.in_(names))
+        bump_catalog_version(self.kind)
+        db.session.commit()
+
+    def flush(self):
+        batch, self._batch = list(self._batch.values()), {}
+        if not batch:
+            return
+        try:
+            self._upsert([row for _, row in batch])
+            self.upserted += len(batch)
+        except SQLAlchemyError:
+            db.session.rollback()
+            # Retry one row at a time so a single bad row does not sink its whole batch
+            for line, row in batch:
+                try:
+                    self._upsert([row])
+                    self.upserted += 1
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    self.error(line, row['name'], str(getattr(e, 'orig', e)))
+
+    def summary(self):
+        return {
+            "processed": self.processed,
+            "upserted": self.upserted,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def import_catalog(kind):
+    """Stream a CSV/NDJSON request body into `kind`; returns (summary, status)."""
+    config = current_app.config
+    # Bulk bodies may be far larger than the per-request default; set before the stream is opened
+    request.max_content_length = config.get('IMPORT_MAX_BYTES', request.max_content_length)
+    importer = CatalogImport(kind, int(config.get('IMPORT_BATCH_SIZE', 1000)), int(config.get('IMPORT_MAX_ERRORS', 1000)))
+    error = None
+    try:
+        for line, raw in _records():
+            importer.add(line, raw)
+    except ImportFormatError as e:
+        error = str(e)
+    except UnicodeDecodeError:
+        error = "The import body must be UTF-8"
+    importer.flush()
+    if importer.upserted:
+        response_cache.invalidate(kind)
+    if error:
+        return {"error": error, **importer.summary()}, 400
+    return importer.summary(), 200
+
+
+def _csv_lines(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def export_catalog(kind):
+    """Stream every row of `kind` in id order as CSV (?format=csv), NDJSON or a JSON list."""
+    model = CATALOG_MODELS[kind]
+    fields = ('id',) + IMPORT_FIELDS[kind]
+    rows = (
+        db.session.query(*[getattr(model, field) for field in fields])
+        .order_by(model.id)
+        .execution_options(yield_per=1000)
+    )
+    if request.args.get('format') == 'csv':
+        return Response(
+            stream_with_context(_csv_lines(fields, rows)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={kind}.csv'},
+        )
+    return stream_items(kind, (dict(zip(fields, row)) for row in rows))
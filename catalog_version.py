@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import Response, g, request
+from flask_restful.utils import unpack
+from werkzeug.http import http_date
+from db_utils import upsert
+from models import db, CatalogVersion
+
+# Click counts get their own generation row ('products.clicks'), bumped once per click flush, so
+# listings that show clicks revalidate after a flush without re-keying everything on the catalog version
+CLICKS_SUFFIX = '.clicks'
+
+
+def bump_catalog_version(name):
+    """Increment the version of a catalog inside the caller's transaction (commit is up to the caller)."""
+    table = CatalogVersion.__table__
+    # ON CONFLICT: two first writes of a catalog must not both try to INSERT its row
+    upsert(
+        table,
+        [{'name': name, 'version': 1, 'updated_at': datetime.utcnow()}],
+        ['name'],
+        {'version': lambda excluded: table.c.version + 1, 'updated_at': lambda excluded: excluded.updated_at},
+    )
+
+
+def bump_click_generation(name):
+    """Mark that the click counts of a catalog changed (commit is up to the caller)."""
+    bump_catalog_version(name + CLICKS_SUFFIX)
+
+
+def get_catalog_version(name):
+    """Return (version, updated_at) for a catalog, or (0, None) if it was never written."""
+    row = db.session.query(CatalogVersion.version, CatalogVersion.updated_at).filter_by(name=name).first()
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+
+def get_listing_version(name):
+    """Return ("version.click_generation", updated_at) for responses that include click counts."""
+    rows = {
+        row.name: row for row in
+        db.session.query(CatalogVersion.name, CatalogVersion.version, CatalogVersion.updated_at)
+        .filter(CatalogVersion.name.in_([name, name + CLICKS_SUFFIX]))
+    }
+    catalog, clicks = rows.get(name), rows.get(name + CLICKS_SUFFIX)
+    version = f"{catalog.version if catalog else 0}.{clicks.version if clicks else 0}"
+    updated = [row.updated_at for row in (catalog, clicks) if row is not None]
+    return version, max(updated) if updated else None
+
+
+def conditional_get(name):
+    """Decorate a Resource.get so it answers If-None-Match/If-Modified-Since from the catalog version.
+
+    The ETag covers the catalog version, its click generation and the full
+    request path (query string included), so a 304 is returned without
+    querying or serializing any rows.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            version, updated_at = get_listing_version(name)
+            # response_cache keys its entries on this version too, so a cached body always matches its ETag
+            g.setdefault('catalog_versions', {})[name] = version
+            digest = hashlib.sha1(f"{name}:{version}:{request.full_path}".encode()).hexdigest()[:20]
+            etag = f'"{digest}"'
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+            if updated_at is not None:
+                headers['Last-Modified'] = http_date(updated_at)
+
+            not_modified = False
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(digest)
+            elif request.if_modified_since and updated_at is not None:
+                not_modified = updated_at.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+            if not_modified:
+                return Response(status=304, headers=headers)
+
+            result = f(*args, **kwargs)
+            if isinstance(result, Response):
+                if result.status_code == 200:
+                    result.headers.update(headers)
+                return result
+            data, code, extra_headers = unpack(result)
+            if code == 200:
+                headers.update(extra_headers or {})
+                return data, code, headers
+            return data, code, extra_headers
+        return decorated
+    return decorator
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from db_utils import upsert
+from replicas import replicas
+from models import db, Product, Service, ClickEvent, ClickRollup, ClickTotal
+
+CLICK_MODELS = {'products': Product, 'services': Service}
+
+# Windows up to this many hours are answered from hourly buckets, longer ones from daily buckets
+HOURLY_WINDOW_LIMIT = 72
+
+# Longest window top_clicked answers; huge values would otherwise overflow the datetime arithmetic
+MAX_WINDOW_HOURS = 366 * 24
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_click_events(kind, counts, occurred_at=None):
+    """Append flushed click counts to the event log and the running total (caller commits).
+
+    A missing total row is left alone: click_totals() seeds it from the
+    catalog columns, which already include these clicks.
+    """
+    occurred_at = occurred_at or datetime.utcnow()
+    db.session.execute(ClickEvent.__table__.insert(), [
+        {'kind': kind, 'item_id': id, 'count': count, 'occurred_at': occurred_at, 'rolled_up': False}
+        for id, count in counts.items()
+    ])
+    db.session.query(ClickTotal).filter_by(kind=kind).update(
+        {ClickTotal.clicks: ClickTotal.clicks + sum(counts.values())}, synchronize_session=False
+    )
+
+
+def rollup_clicks(batch_size=5000):
+    """Fold not yet rolled up click events into hourly and daily buckets; returns events processed."""
+    events = (
+        db.session.query(ClickEvent.id, ClickEvent.kind, ClickEvent.item_id, ClickEvent.count, ClickEvent.occurred_at)
+        .filter(ClickEvent.rolled_up.is_(False))
+        .order_by(ClickEvent.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not events:
+        return 0
+
+    # Claim the batch first; another worker rolling up the same events makes the count differ
+    ids = [event.id for event in events]
+    claimed = (
+        db.session.query(ClickEvent)
+        .filter(ClickEvent.id.in_(ids), ClickEvent.rolled_up.is_(False))
+        .update({ClickEvent.rolled_up: True}, synchronize_session=False)
+    )
+    if claimed != len(ids):
+        db.session.rollback()
+        return 0
+
+    buckets = {}
+    for event in events:
+        for granularity, bucket in (('hour', hour_bucket), ('day', day_bucket)):
+            key = (event.kind, granularity, bucket(event.occurred_at), event.item_id)
+            buckets[key] = buckets.get(key, 0) + event.count
+
+    table = ClickRollup.__table__
+    upsert(table, [
+        {'kind': kind, 'granularity': granularity, 'bucket_start': bucket_start, 'item_id': item_id, 'clicks': clicks}
+        for (kind, granularity, bucket_start, item_id), clicks in buckets.items()
+    ], ['kind', 'granularity', 'bucket_start', 'item_id'], {
+        'clicks': lambda excluded: table.c.clicks + excluded.clicks,
+    })
+    db.session.commit()
+    return len(events)
+
+
+def prune_click_events(retention_days):
+    """Delete rolled up events older than the retention window (caller commits)."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    return (
+        db.session.query(ClickEvent)
+        .filter(ClickEvent.rolled_up.is_(True), ClickEvent.occurred_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+
+
+def top_clicked(kind, hours, limit):
+    """Most clicked items of `kind` over the last `hours` (at most MAX_WINDOW_HOURS), summed from the rollup buckets."""
+    if not 1 <= hours <= MAX_WINDOW_HOURS:
+        raise ValueError(f"hours must be between 1 and {MAX_WINDOW_HOURS}")
+    now = datetime.utcnow()
+    if hours <= HOURLY_WINDOW_LIMIT:
+        granularity, since = 'hour', hour_bucket(now - timedelta(hours=hours))
+    else:
+        granularity, since = 'day', day_bucket(now - timedelta(hours=hours))
+
+    total = func.sum(ClickRollup.clicks).label('clicks')
+    rows = (
+        db.session.query(ClickRollup.item_id, total)
+        .filter(ClickRollup.kind == kind, ClickRollup.granularity == granularity, ClickRollup.bucket_start >= since)
+        .group_by(ClickRollup.item_id)
+        .order_by(total.desc(), ClickRollup.item_id)
+        .limit(limit)
+        .all()
+    )
+
+    model = CLICK_MODELS[kind]
+    names = dict(db.session.query(model.id, model.name).filter(model.id.in_([row.item_id for row in rows])).all()) if rows else {}
+    return {
+        "kind": kind,
+        "granularity": granularity,
+        "since": since.strftime('%Y-%m-%d %H:%M:%S'),
+        "items": [{"id": row.item_id, "name": names.get(row.item_id), "clicks": int(row.clicks)} for row in rows],
+    }
+
+
+def click_totals():
+    """Running totals per kind; seeded once from the catalog tables when missing."""
+    totals = dict(db.session.query(ClickTotal.kind, ClickTotal.clicks).all())
+    missing = [kind for kind in CLICK_MODELS if kind not in totals]
+    if not missing:
+        return totals
+
+    # The seed becomes a permanent running total, so it must not come from a lagging replica
+    replicas.use_primary()
+    table = ClickTotal.__table__
+    for kind in missing:
+        seeded = db.session.query(func.sum(CLICK_MODELS[kind].clicks)).scalar() or 0
+        # Keep the existing value if another worker created the row meanwhile
+        upsert(table, [{'kind': kind, 'clicks': seeded}], ['kind'], {'clicks': lambda excluded: table.c.clicks})
+    db.session.commit()
+    return dict(db.session.query(ClickTotal.kind, ClickTotal.clicks).all())
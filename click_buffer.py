@@ -0,0 +1,133 @@
+import atexit
+import os
+import threading
+import time
+from collections import Counter
+from sqlalchemy import bindparam, func
+from models import db, Product, Service
+from catalog_version import bump_click_generation
+from click_analytics import prune_click_events, record_click_events, rollup_clicks
+from response_cache import response_cache
+
+
+class ClickBuffer:
+    """Accumulates click increments in memory and writes them behind in batches.
+
+    Each flush issues one `UPDATE ... SET clicks = clicks + n` per id, so
+    increments from several workers (each with its own buffer) never
+    overwrite each other.
+    """
+
+    models = {'products': Product, 'services': Service}
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = 5.0
+        self.flush_threshold = 500
+        self.rollup_interval = 60.0
+        self.event_retention_days = 90
+        self._last_rollup = time.monotonic()
+        self._pending = {kind: Counter() for kind in self.models}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = float(app.config.get('CLICK_FLUSH_INTERVAL', self.flush_interval))
+        self.flush_threshold = int(app.config.get('CLICK_FLUSH_THRESHOLD', self.flush_threshold))
+        self.rollup_interval = float(app.config.get('CLICK_ROLLUP_INTERVAL', self.rollup_interval))
+        self.event_retention_days = int(app.config.get('CLICK_EVENT_RETENTION_DAYS', self.event_retention_days))
+        app.extensions['click_buffer'] = self
+        atexit.register(self.flush)
+
+    def add(self, kind, id, count=1):
+        """Record `count` clicks for one product or service id."""
+        with self._lock:
+            self._pending[kind][id] += count
+            self._size += count
+            full = self._size >= self.flush_threshold
+
+        # A non-positive interval disables the write-behind and flushes inline
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every buffered increment to the database in one transaction."""
+        with self._lock:
+            batches = {kind: counts for kind, counts in self._pending.items() if counts}
+            self._pending = {kind: Counter() for kind in self.models}
+            self._size = 0
+        if not batches or self.app is None:
+            return
+
+        with self.app.app_context():
+            try:
+                for kind, counts in batches.items():
+                    table = self.models[kind].__table__
+                    statement = (
+                        table.update()
+                        .where(table.c.id == bindparam('click_id'))
+                        .values(clicks=func.coalesce(table.c.clicks, 0) + bindparam('click_count'))
+                    )
+                    db.session.execute(statement, [
+                        {'click_id': id, 'click_count': count} for id, count in counts.items()
+                    ])
+                    # Listings show clicks: one generation bump per flush keeps their ETags honest
+                    # without touching the catalog version itself
+                    bump_click_generation(kind)
+                    record_click_events(kind, counts)
+                db.session.commit()
+                response_cache.invalidate(*batches)
+            except Exception:
+                db.session.rollback()
+                # Put the increments back so the next flush retries them
+                with self._lock:
+                    for kind, counts in batches.items():
+                        self._pending[kind].update(counts)
+                        self._size += sum(counts.values())
+                self.app.logger.exception("Failed to flush buffered clicks")
+
+    def _ensure_flusher(self):
+        # Started lazily (and again after a fork) so each worker owns its thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='click-buffer-flusher', daemon=True)
+            self._thread.start()
+
+    def rollup(self):
+        """Fold the click event log into hourly/daily buckets and prune old events."""
+        with self.app.app_context():
+            try:
+                while rollup_clicks():
+                    pass
+                prune_click_events(self.event_retention_days)
+                db.session.commit()
+                response_cache.invalidate('click_rollups')
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception("Failed to roll up click events")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if self.rollup_interval > 0 and time.monotonic() - self._last_rollup >= self.rollup_interval:
+                self._last_rollup = time.monotonic()
+                self.rollup()
+
+
+click_buffer = ClickBuffer()
@@ -1,44 +1,256 @@
-from faker  import Faker
-from models import db, Product, Service
-from app import app
+import random
+import time
+from operator import itemgetter
+from collections import Counter
+from datetime import datetime, timedelta
+from faker import Faker
+from sqlalchemy import bindparam, func, text
+from models import db, Product, Service, Booking, ClickEvent, ClickTotal
+from catalog_version import bump_catalog_version, bump_click_generation
+from response_cache import response_cache
+from search_index import search_index
+from taxonomy import recount_categories, resolve_categories
 
-# Initialize Faker
-faker = Faker()
+BOOKING_STATUSES = ('pending', 'confirmed', 'cancelled')
 
-def seed_products(num=10):
-    """Seed the database with fake products."""
-    for _ in range(num):
-        product = Product(
-            name=faker.unique.word().capitalize(),
-            category_name=faker.word(),
-            subcategory_name=faker.word(),
-            description=faker.sentence(),
-            price=round(faker.random.uniform(10, 1000), 2),
-            image_url=faker.image_url(),
-            clicks=faker.random.randint(0, 100)
+
+class Seeder:
+    """Generates reproducible synthetic catalog data and bulk-inserts it in batches.
+
+    Faker is only used up front to build word, sentence and name pools from
+    `seed`. Each batch is then generated column by column with
+    `random.choices` from one seeded RNG and written with a single DBAPI
+    executemany, one transaction per batch. The same seed and anchor date
+    always give the same data.
+    """
+
+    def __init__(self, seed=42, batch_size=20000, anchor=None, days=90, rebuild_indexes_over=100000):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.rebuild_indexes_over = rebuild_indexes_over
+        # Timestamps fall in the `days` before the anchor (default: today 00:00 UTC)
+        self.anchor = anchor or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.days = days
+        faker = Faker()
+        faker.seed_instance(seed)
+        self.words = list(dict.fromkeys(word.capitalize() for word in faker.words(nb=3000)))
+        self.sentences = [faker.sentence(nb_words=12) for _ in range(2000)]
+        self.people = [faker.name() for _ in range(2000)]
+        self.phones = [f"+2547{self.rng.randrange(10**8):08d}" for _ in range(2000)]
+        self.images = [f"https://picsum.photos/seed/{index}/800/600" for index in range(500)]
+        self.amounts = [str(amount) for amount in range(0, 5000, 50)]
+        # A fixed taxonomy, so category filters and counts behave like a real catalog
+        self.categories = [
+            (category, f"{category} {word.lower()}")
+            for category in self.rng.sample(self.words, 20)
+            for word in self.rng.sample(self.words, 8)
+        ]
+
+    # Writing
+
+    def _insert(self, table, columns, batches, total):
+        """executemany INSERT of `columns` for each batch of row tuples; returns rows per second."""
+        started = time.perf_counter()
+        connection = db.session.connection()
+        dialect = connection.dialect
+        if dialect.name == 'sqlite':
+            # Seeding can be redone from the seed, so skip the per-commit fsync and keep index pages cached
+            connection.exec_driver_sql('PRAGMA synchronous = OFF')
+            connection.exec_driver_sql('PRAGMA cache_size = -262144')
+        # Compiled once; rows go to the driver as plain tuples, skipping per-row bind processing
+        compiled = table.insert().values({column: bindparam(column) for column in columns}).compile(dialect=dialect)
+        if compiled.positional:
+            # The statement lists columns in table order
+            reorder = itemgetter(*[columns.index(name) for name in compiled.positiontup])
+            parameters = lambda batch: [reorder(row) for row in batch]
+        else:
+            parameters = lambda batch: [dict(zip(columns, row)) for row in batch]
+        # Large loads are faster with secondary indexes built once afterwards than maintained row by row
+        indexes = list(table.indexes) if total >= self.rebuild_indexes_over else []
+        for index in indexes:
+            index.drop(connection)
+        try:
+            for batch in batches:
+                connection.exec_driver_sql(str(compiled), parameters(batch))
+                db.session.commit()
+                connection = db.session.connection()
+        finally:
+            db.session.rollback()
+            connection = db.session.connection()
+            for index in indexes:
+                index.create(connection, checkfirst=True)  # The drop may have been rolled back
+            db.session.commit()
+        return total / max(time.perf_counter() - started, 1e-9)
+
+    def _batch_sizes(self, num):
+        for offset in range(0, num, self.batch_size):
+            yield offset, min(self.batch_size, num - offset)
+
+    def _datetimes(self, size):
+        anchor, seconds = self.anchor, range(self.days * 86400)
+        return self._stored([anchor - timedelta(seconds=second) for second in self.rng.choices(seconds, k=size)])
+
+    def _stored(self, moments):
+        if db.session.get_bind().dialect.name == 'sqlite':
+            # Pre-formatted the way SQLAlchemy stores DateTime on SQLite
+            return [moment.isoformat(' ', 'microseconds') for moment in moments]
+        return moments
+
+    def _next_id(self, model):
+        return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+    def _sync_sequence(self, model):
+        # Rows were inserted with explicit ids; move Postgres' serial past them
+        if db.session.get_bind().dialect.name == 'postgresql':
+            table = model.__tablename__
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"))
+            db.session.commit()
+
+    # Generators
+
+    def _catalog_batches(self, start, num, low, high, images):
+        rng = self.rng
+        nodes = resolve_categories(self.categories)
+        for offset, size in self._batch_sizes(num):
+            ids = range(start + offset, start + offset + size)
+            # The id suffix keeps names unique however many rows are generated
+            names = [
+                f"{first} {second.lower()} {id}"
+                for first, second, id in zip(rng.choices(self.words, k=size), rng.choices(self.words, k=size), ids)
+            ]
+            categories = rng.choices(self.categories, k=size)
+            prices = [round(low + (high - low) * rng.random(), 2) for _ in ids]
+            yield list(zip(
+                ids, names,
+                [category for category, _ in categories], [subcategory for _, subcategory in categories],
+                *zip(*[nodes[pair] for pair in categories]),
+                rng.choices(self.sentences, k=size), prices,
+                *[rng.choices(self.images, k=size) for _ in range(images)],
+                [0] * size, [1] * size,
+            ))
+
+    def products(self, num):
+        columns = (
+            'id', 'name', 'category_name', 'subcategory_name', 'category_id', 'subcategory_id',
+            'description', 'price', 'image_url', 'clicks', 'version',
+        )
+        start = self._next_id(Product)
+        rate = self._insert(Product.__table__, columns, self._catalog_batches(start, num, 10, 1000, 1), num)
+        self._sync_sequence(Product)
+        search_index.refresh('products', Product.id >= start)
+        recount_categories('products')
+        bump_catalog_version('products')
+        db.session.commit()
+        return rate
+
+    def services(self, num):
+        columns = (
+            'id', 'name', 'category_name', 'subcategory_name', 'category_id', 'subcategory_id',
+            'description', 'price', 'before_service_image', 'after_service_image', 'clicks', 'version',
         )
-        db.session.add(product)
-    db.session.commit()
+        start = self._next_id(Service)
+        rate = self._insert(Service.__table__, columns, self._catalog_batches(start, num, 20, 500, 2), num)
+        self._sync_sequence(Service)
+        search_index.refresh('services', Service.id >= start)
+        recount_categories('services')
+        bump_catalog_version('services')
+        db.session.commit()
+        return rate
+
+    def bookings(self, num):
+        product_ids = [id for id, in db.session.query(Product.id)]
+        service_ids = [id for id, in db.session.query(Service.id)]
+        if not product_ids and not service_ids:
+            raise ValueError("Seed products or services before bookings")
+        rng = self.rng
+        start = self._next_id(Booking)
+        kinds = [True] * bool(product_ids) + [False] * bool(service_ids)  # True: a product booking
+        # One-hour appointments on the hour between 08:00 and 17:00, from `days` ago to 30 days ahead
+        slots = [self.anchor + timedelta(days=day, hours=hour) for day in range(-self.days, 30) for hour in range(8, 18)]
+        appointments = list(zip(
+            [slot.strftime('%Y-%m-%d %H:00') for slot in slots],
+            self._stored(slots), self._stored([slot + timedelta(hours=1) for slot in slots]),
+        ))
+
+        def batches():
+            for offset, size in self._batch_sizes(num):
+                # Each booking is for a product or a service, never both
+                for_product = rng.choices(kinds, k=size)
+                products = rng.choices(product_ids or [None], k=size)
+                services = rng.choices(service_ids or [None], k=size)
+                yield list(zip(
+                    range(start + offset, start + offset + size),
+                    [product if choice else None for product, choice in zip(products, for_product)],
+                    [None if choice else service for service, choice in zip(services, for_product)],
+                    rng.choices(self.people, k=size), rng.choices(self.phones, k=size), rng.choices(self.sentences, k=size),
+                    self._datetimes(size), *zip(*rng.choices(appointments, k=size)),
+                    rng.choices(BOOKING_STATUSES, k=size), rng.choices(self.amounts, k=size),
+                ))
+
+        columns = (
+            'id', 'product_id', 'service_id', 'name', 'phone', 'message', 'timestamp',
+            'appointment', 'appointment_start', 'appointment_end', 'status', 'amount_paid',
+        )
+        rate = self._insert(Booking.__table__, columns, batches(), num)
+        self._sync_sequence(Booking)
+        return rate
+
+    def clicks(self, num):
+        ids = {
+            'products': [id for id, in db.session.query(Product.id)],
+            'services': [id for id, in db.session.query(Service.id)],
+        }
+        kinds = [kind for kind in ids if ids[kind]]
+        if not kinds:
+            raise ValueError("Seed products or services before click events")
+        rng = self.rng
+        totals = {kind: Counter() for kind in kinds}
+
+        def batches():
+            for _, size in self._batch_sizes(num):
+                batch_kinds = rng.choices(kinds, k=size)
+                items = [rng.choice(ids[kind]) for kind in batch_kinds]
+                counts = rng.choices(range(1, 6), k=size)
+                for kind, item_id, count in zip(batch_kinds, items, counts):
+                    totals[kind][item_id] += count
+                yield list(zip(batch_kinds, items, counts, self._datetimes(size), [False] * size))
+
+        rate = self._insert(ClickEvent.__table__, ('kind', 'item_id', 'count', 'occurred_at', 'rolled_up'), batches(), num)
+
+        # Keep the catalog click columns in step with the generated events
+        models = {'products': Product, 'services': Service}
+        for kind, counts in totals.items():
+            table = models[kind].__table__
+            statement = (
+                table.update()
+                .where(table.c.id == bindparam('click_id'))
+                .values(clicks=func.coalesce(table.c.clicks, 0) + bindparam('click_count'))
+            )
+            db.session.execute(statement, [{'click_id': id, 'click_count': count} for id, count in counts.items()])
+            bump_click_generation(kind)
+        # click_totals() re-seeds the running totals from the columns on next read
+        db.session.query(ClickTotal).delete()
+        db.session.commit()
+        response_cache.invalidate(*kinds)
+        return rate
+
+
+def seed_products(num=10, seed=42):
+    """Seed the database with fake products."""
+    Seeder(seed).products(num)
     print(f"Seeded {num} products.")
 
-def seed_services(num=10):
+
+def seed_services(num=10, seed=42):
     """Seed the database with fake services."""
-    for _ in range(num):
-        service = Service(
-            name=faker.unique.word().capitalize(),
-            description=faker.sentence(),
-            price=round(faker.random.uniform(20, 500), 2),
-            category_name=faker.word(),
-            subcategory_name=faker.word(),
-            service_img=faker.image_url(),
-            clicks=faker.random.randint(0, 100)
-        )
-        db.session.add(service)
-    db.session.commit()
+    Seeder(seed).services(num)
     print(f"Seeded {num} services.")
 
+
 if __name__ == "__main__":
-    # Example usage: Call these functions after initializing the database
+    from app import app
+
+    # Example usage: `flask seed` generates larger datasets
     with app.app_context():
         seed_products(15)  # Seed 15 products
         seed_services(15)  # Seed 15 services
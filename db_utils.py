@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+from sqlalchemy import literal
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db
+
+_UPSERT_INSERTS = {'postgresql': postgresql_insert, 'sqlite': sqlite_insert}
+
+
+def upsert(table, rows, index_elements, set_):
+    """INSERT ... ON CONFLICT (index_elements) DO UPDATE for a batch of row dicts.
+
+    `set_` maps column names to a callable receiving the incoming values
+    (the `excluded` pseudo-table), e.g.
+    {'clicks': lambda excluded: table.c.clicks + excluded.clicks}.
+    Runs inside the caller's transaction.
+    """
+    if not rows:
+        return
+    insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={name: value(statement.excluded) for name, value in set_.items()},
+        )
+        db.session.execute(statement, rows)
+        return
+
+    # Other engines: update first, insert whatever did not exist yet
+    for row in rows:
+        excluded = SimpleNamespace(**{name: literal(value) for name, value in row.items()})
+        match = [table.c[name] == row[name] for name in index_elements]
+        updated = db.session.execute(
+            table.update().where(*match).values({name: value(excluded) for name, value in set_.items()})
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert().values(row))
@@ -0,0 +1,34 @@
+# Gunicorn settings, picked up automatically by `gunicorn app:app` (see Procfile).
+# Everything is driven by env vars so the deployment can be tuned without a code change.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# gthread (default) runs several requests per worker process, so a request waiting on the
+# database, the password hashing pool or a slow client no longer blocks the whole worker.
+# Set GUNICORN_WORKER_CLASS=sync for the old behaviour, or gevent if gevent is installed.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))  # gevent only
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def worker_exit(server, worker):
+    # Write out clicks still sitting in this worker's buffer
+    from click_buffer import click_buffer
+    click_buffer.flush()
+
+    # Keep this worker's request metrics in the host totals
+    from metrics import metrics
+    metrics.retire()
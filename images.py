@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from models import db, Product, Service
+from catalog_version import bump_catalog_version
+from response_cache import response_cache
+from uploads import upload_store
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Without Pillow uploads are served as originals only
+    Image = None
+
+# Columns holding an uploaded image key, and the column its srcset is written to
+IMAGE_COLUMNS = {
+    'products': [(Product, 'image_url', 'image_srcset')],
+    'services': [
+        (Service, 'before_service_image', 'before_image_srcset'),
+        (Service, 'after_service_image', 'after_image_srcset'),
+    ],
+}
+
+
+def _save_atomically(image, path, format, quality):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.part"
+    image.save(partial, format=format.upper(), quality=quality)
+    os.replace(partial, path)
+
+
+def render_derivatives(root, key, widths, formats, thumbnail_size, quality):
+    """Write resized variants of root/key next to it; returns {'thumbnail': key, format: [(width, key), ...]}.
+
+    Runs in a pool process. Derivative keys depend only on the original's
+    key, so variants that already exist (a re-uploaded image) are kept.
+    """
+    stem = os.path.splitext(key)[0]
+    derivatives = {'thumbnail': f"{stem}/thumb.webp"}
+    with Image.open(os.path.join(root, key)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'transparency' in original.info or 'A' in original.getbands() else 'RGB')
+
+        thumbnail_path = os.path.join(root, derivatives['thumbnail'])
+        if not os.path.exists(thumbnail_path):
+            _save_atomically(ImageOps.fit(original, (thumbnail_size, thumbnail_size), Image.LANCZOS), thumbnail_path, 'webp', quality)
+
+        # Never upscale: widths past the original collapse into the original width
+        for width in sorted({min(width, original.width) for width in widths}):
+            resized = None
+            for format in formats:
+                derivative = f"{stem}/w{width}.{format}"
+                derivatives.setdefault(format, []).append((width, derivative))
+                path = os.path.join(root, derivative)
+                if os.path.exists(path):
+                    continue
+                if resized is None:
+                    height = max(1, round(original.height * width / original.width))
+                    resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+                _save_atomically(resized, path, format, quality)
+    return derivatives
+
+
+class ImagePipeline:
+    """Creates thumbnails and responsive WebP/AVIF variants of uploaded images on a process pool.
+
+    Once an upload's variants exist, every row referencing its key gets a
+    srcset record ({'thumbnail': url, 'webp': srcset, 'avif': srcset}) and
+    the catalog caches are invalidated. With IMAGE_WORKERS=0 images are
+    processed inline on the request thread.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 1
+        self.widths = (160, 320, 640, 1024)
+        self.formats = ('avif', 'webp')
+        self.thumbnail_size = 160
+        self.quality = 75
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = int(app.config.get('IMAGE_WORKERS', self.workers))
+        self.widths = tuple(int(width) for width in app.config.get('IMAGE_WIDTHS', self.widths))
+        self.thumbnail_size = int(app.config.get('IMAGE_THUMBNAIL_SIZE', self.thumbnail_size))
+        self.quality = int(app.config.get('IMAGE_QUALITY', self.quality))
+        formats = app.config.get('IMAGE_FORMATS', self.formats)
+        # Skip formats this Pillow build cannot encode (AVIF needs libavif)
+        self.formats = tuple(format for format in formats if Image is not None and features.check(format))
+        app.extensions['image_pipeline'] = self
+
+    def _pool(self):
+        # Created lazily, and again after a fork, so every gunicorn worker owns its pool. Children come
+        # from a forkserver: forking a threaded (gthread) worker can copy a held lock into the child
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _render_args(self, key):
+        return upload_store.root, key, self.widths, self.formats, self.thumbnail_size, self.quality
+
+    def submit(self, url):
+        """Queue derivative generation for an uploaded image URL (call after the row is committed)."""
+        if Image is None or not upload_store.is_stored(url):
+            return
+        key = upload_store.key(url)
+        if self.workers <= 0:
+            self.process(key)
+            return
+        future = self._pool().submit(render_derivatives, *self._render_args(key))
+        future.add_done_callback(lambda done: self._finished(key, done))
+
+    def process(self, key):
+        """Generate derivatives for `key` in this process and store the srcset."""
+        try:
+            derivatives = render_derivatives(*self._render_args(key))
+        except Exception:
+            self.app.logger.exception("Failed to create image derivatives for %s", key)
+            return
+        self._store(key, derivatives)
+
+    def _finished(self, key, future):
+        try:
+            derivatives = future.result()
+        except Exception:
+            self.app.logger.exception("Failed to create image derivatives for %s", key)
+            return
+        self._store(key, derivatives)
+
+    def _store(self, key, derivatives):
+        srcset = {'thumbnail': upload_store.url(derivatives['thumbnail'])}
+        for format in self.formats:
+            srcset[format] = ', '.join(f"{upload_store.url(derivative)} {width}w" for width, derivative in derivatives[format])
+
+        with self.app.app_context():
+            changed = []
+            for kind, columns in IMAGE_COLUMNS.items():
+                updated = 0
+                for model, source, target in columns:
+                    table = model.__table__
+                    # Matching on the image leaves rows whose image changed meanwhile alone
+                    updated += db.session.execute(
+                        table.update().where(table.c[source].in_([upload_store.url(key), key])).values({target: srcset})
+                    ).rowcount
+                if updated:
+                    bump_catalog_version(kind)
+                    changed.append(kind)
+            db.session.commit()
+        response_cache.invalidate(*changed)
+
+    def backfill(self):
+        """Process every uploaded image that has no srcset yet; returns how many were processed."""
+        keys = set()
+        for columns in IMAGE_COLUMNS.values():
+            for model, source, target in columns:
+                rows = db.session.query(getattr(model, source)).filter(
+                    getattr(model, source).isnot(None), getattr(model, target).is_(None)
+                ).distinct()
+                keys.update(upload_store.key(value) for value, in rows if upload_store.is_stored(value))
+        for key in sorted(keys):
+            self.process(key)
+        return len(keys)
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,209 @@
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def lockout_key(email):
+    """Fixed-size key for an email, so huge or hostile inputs cost the same memory."""
+    return hashlib.sha1((email or '').strip().lower().encode()).hexdigest()
+
+
+def sliding_count(current, previous, now, window):
+    """Sliding-window estimate from the current and previous fixed windows."""
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class MemoryLockoutStore:
+    """Per-process store split into lock stripes, each holding two bounded LRU maps.
+
+    `counters` maps a key to [window_index, current, previous, expires_at] and
+    `locked` maps a locked key to its locked_until. Lockouts all last about as
+    long, so `locked` is in expiry order. Each map holds at most
+    max_keys / stripes entries and every operation is O(1), so memory and CPU
+    stay bounded no matter how many distinct emails are tried. When `locked`
+    is full, the lockout closest to expiry is dropped first.
+    """
+
+    def __init__(self, window, max_keys=100000, stripes=16):
+        self.window = window
+        self.per_stripe = max(1, max_keys // stripes)
+        self._stripes = [(threading.Lock(), OrderedDict(), OrderedDict()) for _ in range(stripes)]
+
+    def _stripe(self, key):
+        return self._stripes[int(key[:8], 16) % len(self._stripes)]
+
+    def _lock_out(self, locked, key, until, now):
+        locked[key] = until
+        locked.move_to_end(key)
+        # Expired lockouts sit at the head; each is popped once, so this is amortized O(1)
+        while locked and next(iter(locked.values())) <= now:
+            locked.popitem(last=False)
+        if len(locked) > self.per_stripe:
+            locked.popitem(last=False)
+
+    def record_failure(self, key, max_attempts, lockout_seconds):
+        now = time.time()
+        index = int(now // self.window)
+        lock, counters, locked = self._stripe(key)
+        with lock:
+            entry = counters.get(key)
+            if entry is None or entry[3] <= now:
+                entry = [index, 0, 0, 0.0]
+            elif entry[0] != index:
+                # Roll the windows forward; anything older than one window no longer counts
+                entry[2] = entry[1] if entry[0] == index - 1 else 0
+                entry[0], entry[1] = index, 0
+            entry[1] += 1
+            if sliding_count(entry[1], entry[2], now, self.window) >= max_attempts:
+                self._lock_out(locked, key, now + lockout_seconds, now)
+            entry[3] = (index + 2) * self.window
+            counters[key] = entry
+            counters.move_to_end(key)
+            if len(counters) > self.per_stripe:
+                counters.popitem(last=False)
+
+    def is_locked(self, key):
+        now = time.time()
+        lock, counters, locked = self._stripe(key)
+        with lock:
+            until = locked.get(key)
+            if until is not None and until <= now:
+                del locked[key]
+                return False
+            return until is not None
+
+    def reset(self, key):
+        lock, counters, locked = self._stripe(key)
+        with lock:
+            counters.pop(key, None)
+            locked.pop(key, None)
+
+
+class SQLiteLockoutStore:
+    """Store shared by every worker on one host through a SQLite file."""
+
+    def __init__(self, window, path, prune_every=1000):
+        self.window = window
+        self.path = path
+        self.prune_every = prune_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lockouts ("
+                "key TEXT PRIMARY KEY, window_index INTEGER, current INTEGER, previous INTEGER, "
+                "locked_until REAL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_lockouts_expires_at ON lockouts (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def record_failure(self, key, max_attempts, lockout_seconds):
+        now = time.time()
+        index = int(now // self.window)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_index, current, previous, locked_until FROM lockouts WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            window_index, current, previous, locked_until = row or (index, 0, 0, 0.0)
+            if window_index != index:
+                previous = current if window_index == index - 1 else 0
+                current = 0
+            current += 1
+            if sliding_count(current, previous, now, self.window) >= max_attempts:
+                locked_until = now + lockout_seconds
+            conn.execute(
+                "INSERT OR REPLACE INTO lockouts VALUES (?, ?, ?, ?, ?, ?)",
+                (key, index, current, previous, locked_until, max(locked_until, (index + 2) * self.window)),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                conn.execute("DELETE FROM lockouts WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def is_locked(self, key):
+        row = self._connect().execute("SELECT locked_until FROM lockouts WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def reset(self, key):
+        self._connect().execute("DELETE FROM lockouts WHERE key = ?", (key,))
+
+
+class RedisLockoutStore:
+    """Store shared across hosts on any Redis-compatible client; every key carries its own expiry."""
+
+    def __init__(self, window, client, prefix='lockout:'):
+        self.window = window
+        self.client = client
+        self.prefix = prefix
+
+    def record_failure(self, key, max_attempts, lockout_seconds):
+        now = time.time()
+        index = int(now // self.window)
+        current_key = f"{self.prefix}{key}:{index}"
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(self.window * 2))
+        pipe.get(f"{self.prefix}{key}:{index - 1}")
+        current, _, previous = pipe.execute()
+        if sliding_count(int(current), int(previous or 0), now, self.window) >= max_attempts:
+            self.client.set(f"{self.prefix}{key}:locked", 1, ex=max(1, math.ceil(lockout_seconds)))
+
+    def is_locked(self, key):
+        return bool(self.client.exists(f"{self.prefix}{key}:locked"))
+
+    def reset(self, key):
+        index = int(time.time() // self.window)
+        self.client.delete(f"{self.prefix}{key}:locked", f"{self.prefix}{key}:{index}", f"{self.prefix}{key}:{index - 1}")
+
+
+class Lockouts:
+    """Failed-login tracking with a pluggable backend chosen by LOCKOUT_BACKEND (memory, sqlite, redis)."""
+
+    def __init__(self, app=None):
+        self.max_attempts = 5
+        self.lockout_seconds = 15 * 60
+        self.store = MemoryLockoutStore(self.lockout_seconds)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = int(app.config.get('LOCKOUT_MAX_ATTEMPTS', self.max_attempts))
+        self.lockout_seconds = int(app.config.get('LOCKOUT_SECONDS', self.lockout_seconds))
+        backend = app.config.get('LOCKOUT_BACKEND', 'memory')
+        if backend == 'sqlite':
+            self.store = SQLiteLockoutStore(self.lockout_seconds, app.config.get('LOCKOUT_SQLITE_PATH', 'lockouts.sqlite'))
+        elif backend == 'redis':
+            import redis  # Only needed when lockouts are shared through Redis
+            self.store = RedisLockoutStore(self.lockout_seconds, redis.Redis.from_url(app.config['LOCKOUT_REDIS_URL']))
+        else:
+            self.store = MemoryLockoutStore(self.lockout_seconds, int(app.config.get('LOCKOUT_MAX_KEYS', 100000)))
+        app.extensions['lockouts'] = self
+
+    def is_locked(self, email):
+        return self.store.is_locked(lockout_key(email))
+
+    def record_failure(self, email):
+        self.store.record_failure(lockout_key(email), self.max_attempts, self.lockout_seconds)
+
+    def reset(self, email):
+        self.store.reset(lockout_key(email))
+
+
+lockouts = Lockouts()
@@ -0,0 +1,337 @@
+import fcntl
+import glob
+import heapq
+import json
+import os
+import threading
+import time
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram upper bounds; every histogram also has the implicit +Inf bucket
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Label of requests that matched no route, so 404 scans cannot blow up the label set
+UNMATCHED_ROUTE = '<unmatched>'
+
+# Statements kept per request for the slow request log
+SLOW_LOG_QUERIES = 5
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}  # label values -> [count]
+
+    def inc(self, labels=(), amount=1):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [0]
+        entry[0] += amount
+
+    def lines(self, values):
+        for labels, (count,) in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {_number(count)}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [0] * (len(self.buckets) + 1) + [0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        entry[index] += 1
+        entry[-1] += value
+
+    def lines(self, values):
+        for labels, entry in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), entry):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_number(bound)}"'
+                yield f'{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {_number(entry[-1])}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+class RequestStats:
+    """What one request spent, filled in by the SQLAlchemy and serializer hooks."""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialization_seconds', 'slowest', 'responded', 'recorded')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.slowest = []  # Min-heap of (seconds, sequence, statement)
+        self.responded = False
+        self.recorded = False
+
+
+def _current():
+    # The request being served on this thread, if any; streamed bodies keep their request context
+    return g.get('request_stats') if has_app_context() else None
+
+
+def _counting(body, size):
+    # Wraps a streamed body to measure what is actually sent
+    for chunk in body:
+        size[0] += len(chunk)
+        yield chunk
+
+
+class Metrics:
+    """Per-route request metrics and SQL instrumentation, rendered as Prometheus text at /metrics.
+
+    Every request records its latency (per method, route and status), the
+    number and total time of its SQL statements, its JSON serialization time
+    and its response size. Statements are timed through engine events, so
+    the primary and the replicas are all covered. Requests and statements
+    over SLOW_REQUEST_MS / SLOW_QUERY_MS are logged with their SQL.
+
+    Values live in each worker process. With METRICS_DIR set, workers also
+    write snapshots there and /metrics adds them all up, so a scrape that
+    lands on any worker sees the whole host.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.slow_request_seconds = 1.0
+        self.slow_query_seconds = 0.2
+        self.directory = None
+        self.write_interval = 5.0
+        self._written = 0.0
+        self._lock = threading.Lock()
+        labels = ('method', 'route')
+        self.request_duration = Histogram('http_request_duration_seconds', 'Request latency until the response is sent.', labels + ('status',))
+        self.request_queries = Histogram('http_request_db_queries', 'SQL statements per request.', labels, QUERY_COUNT_BUCKETS)
+        self.request_db_time = Histogram('http_request_db_seconds', 'Time per request spent in SQL statements.', labels)
+        self.request_serialization = Histogram('http_request_serialization_seconds', 'Time per request spent encoding JSON.', labels)
+        self.response_size = Histogram('http_response_size_bytes', 'Response body size.', labels, SIZE_BUCKETS)
+        self.slow_requests = Counter('http_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', labels)
+        self.query_duration = Histogram('db_query_duration_seconds', 'SQL statement latency, in and outside requests.')
+        self.slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.')
+        self.families = (
+            self.request_duration, self.request_queries, self.request_db_time, self.request_serialization,
+            self.response_size, self.slow_requests, self.query_duration, self.slow_queries,
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = bool(app.config.get('METRICS_ENABLED', self.enabled))
+        self.slow_request_seconds = float(app.config.get('SLOW_REQUEST_MS', self.slow_request_seconds * 1000)) / 1000
+        self.slow_query_seconds = float(app.config.get('SLOW_QUERY_MS', self.slow_query_seconds * 1000)) / 1000
+        self.directory = app.config.get('METRICS_DIR') or None
+        self.write_interval = float(app.config.get('METRICS_WRITE_INTERVAL', self.write_interval))
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Engine-class events reach every engine, including ones created later for replicas
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # Request hooks
+
+    def _before_request(self):
+        g.request_stats = RequestStats()
+
+    def _route(self):
+        return (request.method, request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE)
+
+    def _after_request(self, response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        stats.responded = True
+        route, status = self._route(), response.status_code
+        size = [0]
+        if response.is_streamed:
+            # Streamed bodies are produced after this hook; measure them once they are sent
+            response.response = _counting(response.response, size)
+        else:
+            size[0] = response.content_length or 0
+        response.call_on_close(lambda: self._record(stats, route, status, size[0]))
+        return response
+
+    def _teardown_request(self, exc):
+        # Errors that propagate past Flask never reach the after_request hook
+        stats = g.get('request_stats')
+        if exc is not None and stats is not None and not stats.responded:
+            self._record(stats, self._route(), 500, 0)
+
+    def _record(self, stats, route, status, size):
+        if stats.recorded:
+            return
+        stats.recorded = True
+        duration = time.perf_counter() - stats.started
+        with self._lock:
+            self.request_duration.observe(route + (str(status),), duration)
+            self.request_queries.observe(route, stats.queries)
+            self.request_db_time.observe(route, stats.db_seconds)
+            self.request_serialization.observe(route, stats.serialization_seconds)
+            self.response_size.observe(route, size)
+            if duration >= self.slow_request_seconds:
+                self.slow_requests.inc(route)
+        if duration >= self.slow_request_seconds:
+            self._log_slow_request(stats, route, status, duration)
+        if self.directory and time.monotonic() - self._written >= self.write_interval:
+            self.write()
+
+    def _log_slow_request(self, stats, route, status, duration):
+        method, rule = route
+        lines = [
+            f"Slow request {method} {rule} -> {status} in {duration * 1000:.1f} ms "
+            f"({stats.queries} queries, {stats.db_seconds * 1000:.1f} ms in SQL, "
+            f"{stats.serialization_seconds * 1000:.1f} ms serializing)"
+        ]
+        for seconds, _, statement in sorted(stats.slowest, reverse=True):
+            lines.append(f"  {seconds * 1000:.1f} ms: {statement}")
+        self.app.logger.warning('\n'.join(lines))
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        with self._lock:
+            self.query_duration.observe((), seconds)
+            if seconds >= self.slow_query_seconds:
+                self.slow_queries.inc()
+        stats = _current()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += seconds
+            entry = (seconds, stats.queries, statement)
+            if len(stats.slowest) < SLOW_LOG_QUERIES:
+                heapq.heappush(stats.slowest, entry)
+            elif seconds > stats.slowest[0][0]:
+                heapq.heapreplace(stats.slowest, entry)
+        if seconds >= self.slow_query_seconds and self.app is not None:
+            # Only the SQL: parameters may carry personal data or password hashes
+            where = f"{request.method} {request.path}" if stats is not None else "outside a request"
+            self.app.logger.warning("Slow query (%.1f ms, %s): %s", seconds * 1000, where, statement)
+
+    def serialized(self, seconds):
+        """Count `seconds` of JSON encoding against the current request."""
+        stats = _current()
+        if stats is not None:
+            stats.serialization_seconds += seconds
+
+    # Exposition
+
+    def snapshot(self):
+        with self._lock:
+            return {family.name: [[list(labels), list(entry)] for labels, entry in family.values.items()] for family in self.families}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _dump(self, path, data):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)  # Readers never see a half-written file
+
+    def write(self):
+        """Write this worker's snapshot to METRICS_DIR for the other workers' scrapes."""
+        self._written = time.monotonic()
+        self._dump(self._path(f'worker-{os.getpid()}.json'), self.snapshot())
+
+    def retire(self):
+        """Fold this worker's values into METRICS_DIR's retired totals (called when a worker exits)."""
+        if not self.enabled or not self.directory:
+            return
+        with open(self._path('retired.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = self._load(self._path('retired.json'))
+            self._merge(totals, self.snapshot())
+            self._dump(self._path('retired.json'), totals)
+        try:
+            os.remove(self._path(f'worker-{os.getpid()}.json'))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def _merge(totals, snapshot):
+        for name, rows in snapshot.items():
+            family = totals.setdefault(name, [])
+            index = {tuple(labels): entry for labels, entry in family}
+            for labels, entry in rows:
+                existing = index.get(tuple(labels))
+                if existing is None or len(existing) != len(entry):
+                    family.append([labels, list(entry)])
+                    index[tuple(labels)] = family[-1][1]
+                else:
+                    existing[:] = [a + b for a, b in zip(existing, entry)]
+
+    def render(self):
+        """Every metric in the Prometheus text format (version 0.0.4)."""
+        totals = self.snapshot()
+        if self.directory:
+            own = self._path(f'worker-{os.getpid()}.json')
+            for path in glob.glob(self._path('*.json')):
+                if path != own:
+                    self._merge(totals, self._load(path))
+        lines = []
+        for family in self.families:
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.type}')
+            values = {tuple(labels): entry for labels, entry in totals.get(family.name, [])}
+            lines.extend(family.lines(values))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,26 @@
+"""add product listing indexes
+
+Revision ID: 3f1c2a9d7e41
+Revises: c0f3ad2cfca5
+Create Date: 2026-10-18 09:12:04.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7e41'
+down_revision = 'c0f3ad2cfca5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_products_category_subcategory_id', 'products', ['category_name', 'subcategory_name', 'id'], unique=False)
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_products_price_id', table_name='products')
+    op.drop_index('ix_products_category_subcategory_id', table_name='products')
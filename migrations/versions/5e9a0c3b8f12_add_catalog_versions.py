@@ -0,0 +1,29 @@
+"""add catalog versions
+
+Revision ID: 5e9a0c3b8f12
+Revises: d27b9f4e1a63
+Create Date: 2026-10-18 12:41:15.207463
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9a0c3b8f12'
+down_revision = 'd27b9f4e1a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_versions')
@@ -0,0 +1,26 @@
+"""add service listing indexes
+
+Revision ID: 8a4d6e0b5c27
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-18 10:03:47.902214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6e0b5c27'
+down_revision = '3f1c2a9d7e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_services_category_subcategory_id', 'services', ['category_name', 'subcategory_name', 'id'], unique=False)
+    op.create_index('ix_services_price_id', 'services', ['price', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_services_price_id', table_name='services')
+    op.drop_index('ix_services_category_subcategory_id', table_name='services')
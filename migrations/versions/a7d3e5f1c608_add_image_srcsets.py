@@ -0,0 +1,34 @@
+"""add image srcsets
+
+Revision ID: a7d3e5f1c608
+Revises: f4a2c7e9d315
+Create Date: 2026-10-18 18:02:41.537219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f1c608'
+down_revision = 'f4a2c7e9d315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_srcset', sa.JSON(), nullable=True))
+
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('before_image_srcset', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('after_image_srcset', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.drop_column('after_image_srcset')
+        batch_op.drop_column('before_image_srcset')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('image_srcset')
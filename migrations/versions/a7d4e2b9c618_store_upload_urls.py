@@ -0,0 +1,58 @@
+"""store upload urls
+
+Revision ID: a7d4e2b9c618
+Revises: e3b7c9a5d284
+Create Date: 2026-10-20 10:04:52.417306
+
+"""
+import os
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4e2b9c618'
+down_revision = 'e3b7c9a5d284'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of uploads.KEY_PATTERN as of this revision
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+URL_PREFIX = os.getenv('UPLOAD_URL_PREFIX', '/uploads/')
+IMAGE_COLUMNS = {
+    'products': ('image_url',),
+    'services': ('before_service_image', 'after_service_image'),
+}
+
+
+def _rewrite(convert):
+    bind = op.get_bind()
+    for table_name, columns in IMAGE_COLUMNS.items():
+        for column in columns:
+            table = sa.table(table_name, sa.column(column, sa.String))
+            values = [value for value, in bind.execute(sa.select(table.c[column]).distinct()) if value]
+            params = [{'old': value, 'new': convert(value)} for value in values if convert(value) != value]
+            if params:
+                bind.execute(
+                    table.update().where(table.c[column] == sa.bindparam('old')).values({column: sa.bindparam('new')}),
+                    params,
+                )
+
+
+def _to_url(value):
+    return URL_PREFIX + value if KEY_PATTERN.match(value) else value
+
+
+def _to_key(value):
+    key = value[len(URL_PREFIX):] if value.startswith(URL_PREFIX) else value
+    return key if KEY_PATTERN.match(key) else value
+
+
+def upgrade():
+    # Uploaded images were stored as bare keys; rows now hold their URLs, like the srcset columns
+    _rewrite(_to_url)
+
+
+def downgrade():
+    _rewrite(_to_key)
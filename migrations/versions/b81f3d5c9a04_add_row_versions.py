@@ -0,0 +1,32 @@
+"""add row versions to products and services
+
+Revision ID: b81f3d5c9a04
+Revises: 5e9a0c3b8f12
+Create Date: 2026-10-18 13:52:08.664120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f3d5c9a04'
+down_revision = '5e9a0c3b8f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('services', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_column('version')
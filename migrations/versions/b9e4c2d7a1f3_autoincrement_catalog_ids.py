@@ -0,0 +1,32 @@
+"""never reuse product and service ids
+
+Revision ID: b9e4c2d7a1f3
+Revises: a7d4e2b9c618
+Create Date: 2026-10-18 15:12:40.218734
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e4c2d7a1f3'
+down_revision = 'a7d4e2b9c618'
+branch_labels = None
+depends_on = None
+
+
+def _recreate(autoincrement):
+    # Only SQLite reuses ids after a delete; PostgreSQL sequences never hand one out twice
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table_name in ('products', 'services'):
+        with op.batch_alter_table(table_name, recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+
+
+def upgrade():
+    _recreate(True)
+
+
+def downgrade():
+    _recreate(False)
@@ -0,0 +1,24 @@
+"""add product subcategory index
+
+Revision ID: c4f8a2e6d913
+Revises: b9e4c2d7a1f3
+Create Date: 2026-10-18 16:05:21.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a2e6d913'
+down_revision = 'b9e4c2d7a1f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_products_subcategory_name_id', 'products', ['subcategory_name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_products_subcategory_name_id', table_name='products')
@@ -0,0 +1,53 @@
+"""add catalog search index
+
+Revision ID: c5e2b8d4f1a3
+Revises: a7d3e5f1c608
+Create Date: 2026-10-18 21:14:05.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2b8d4f1a3'
+down_revision = 'a7d3e5f1c608'
+branch_labels = None
+depends_on = None
+
+CATALOGS = ('products', 'services')
+
+
+def upgrade():
+    # Full-text search tables kept in sync by search_index.py; filled from the existing rows
+    dialect = op.get_bind().dialect.name
+    for table in CATALOGS:
+        if dialect == 'sqlite':
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_search USING fts5("
+                f"name, category_name, subcategory_name, description, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            op.execute(
+                f"INSERT INTO {table}_search (rowid, name, category_name, subcategory_name, description) "
+                f"SELECT id, coalesce(name, ''), coalesce(category_name, ''), coalesce(subcategory_name, ''), "
+                f"coalesce(description, '') FROM {table}"
+            )
+        elif dialect == 'postgresql':
+            op.execute(
+                f"CREATE TABLE {table}_search ("
+                f"id integer PRIMARY KEY REFERENCES {table} (id) ON DELETE CASCADE, document tsvector NOT NULL)"
+            )
+            op.execute(
+                f"INSERT INTO {table}_search (id, document) SELECT id, "
+                f"setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+                f"setweight(to_tsvector('simple'::regconfig, coalesce(category_name, '')), 'B') || "
+                f"setweight(to_tsvector('simple'::regconfig, coalesce(subcategory_name, '')), 'B') || "
+                f"setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'D') FROM {table}"
+            )
+            op.execute(f"CREATE INDEX ix_{table}_search_document ON {table}_search USING gin (document)")
+
+
+def downgrade():
+    for table in CATALOGS:
+        op.execute(f"DROP TABLE IF EXISTS {table}_search")
@@ -0,0 +1,26 @@
+"""add booking status timestamp indexes
+
+Revision ID: d27b9f4e1a63
+Revises: 8a4d6e0b5c27
+Create Date: 2026-10-18 11:26:39.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27b9f4e1a63'
+down_revision = '8a4d6e0b5c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_bookings_service_status_timestamp', 'bookings', ['service_id', 'status', 'timestamp'], unique=False)
+    op.create_index('ix_bookings_product_status_timestamp', 'bookings', ['product_id', 'status', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bookings_product_status_timestamp', table_name='bookings')
+    op.drop_index('ix_bookings_service_status_timestamp', table_name='bookings')
@@ -0,0 +1,85 @@
+"""add category taxonomy
+
+Revision ID: d8a3f6c2e915
+Revises: c5e2b8d4f1a3
+Create Date: 2026-10-18 22:31:47.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a3f6c2e915'
+down_revision = 'c5e2b8d4f1a3'
+branch_labels = None
+depends_on = None
+
+CATALOGS = ('products', 'services')
+
+
+def upgrade():
+    op.create_table('categories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('subcategories',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('product_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('service_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], name=op.f('fk_subcategories_category_id_categories')),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('category_id', 'name', name='uq_subcategories_category_id_name')
+    )
+
+    # One node per distinct name pair already used by products and services
+    op.execute(
+        "INSERT INTO categories (name) "
+        "SELECT category_name FROM products UNION SELECT category_name FROM services"
+    )
+    op.execute(
+        "INSERT INTO subcategories (category_id, name) "
+        "SELECT categories.id, pairs.subcategory_name FROM ("
+        "SELECT category_name, subcategory_name FROM products UNION "
+        "SELECT category_name, subcategory_name FROM services"
+        ") AS pairs JOIN categories ON categories.name = pairs.category_name"
+    )
+
+    for table in CATALOGS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('subcategory_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(batch_op.f(f'fk_{table}_category_id_categories'), 'categories', ['category_id'], ['id'])
+            batch_op.create_foreign_key(batch_op.f(f'fk_{table}_subcategory_id_subcategories'), 'subcategories', ['subcategory_id'], ['id'])
+            batch_op.create_index(f'ix_{table}_subcategory_id', ['subcategory_id'], unique=False)
+
+        op.execute(
+            f"UPDATE {table} SET "
+            f"category_id = (SELECT id FROM categories WHERE categories.name = {table}.category_name), "
+            f"subcategory_id = (SELECT subcategories.id FROM subcategories "
+            f"JOIN categories ON categories.id = subcategories.category_id "
+            f"WHERE categories.name = {table}.category_name AND subcategories.name = {table}.subcategory_name)"
+        )
+
+    op.execute(
+        "UPDATE subcategories SET "
+        "product_count = (SELECT COUNT(*) FROM products WHERE products.subcategory_id = subcategories.id), "
+        "service_count = (SELECT COUNT(*) FROM services WHERE services.subcategory_id = subcategories.id)"
+    )
+
+
+def downgrade():
+    for table in reversed(CATALOGS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_subcategory_id')
+            batch_op.drop_constraint(batch_op.f(f'fk_{table}_subcategory_id_subcategories'), type_='foreignkey')
+            batch_op.drop_constraint(batch_op.f(f'fk_{table}_category_id_categories'), type_='foreignkey')
+            batch_op.drop_column('subcategory_id')
+            batch_op.drop_column('category_id')
+
+    op.drop_table('subcategories')
+    op.drop_table('categories')
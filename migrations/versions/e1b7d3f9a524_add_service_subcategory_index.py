@@ -0,0 +1,24 @@
+"""add service subcategory index
+
+Revision ID: e1b7d3f9a524
+Revises: c4f8a2e6d913
+Create Date: 2026-10-18 16:09:47.331208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b7d3f9a524'
+down_revision = 'c4f8a2e6d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_services_subcategory_name_id', 'services', ['subcategory_name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_services_subcategory_name_id', table_name='services')
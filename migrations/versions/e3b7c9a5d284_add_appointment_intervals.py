@@ -0,0 +1,99 @@
+"""add appointment intervals
+
+Revision ID: e3b7c9a5d284
+Revises: d8a3f6c2e915
+Create Date: 2026-10-19 09:12:36.184530
+
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7c9a5d284'
+down_revision = 'd8a3f6c2e915'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of scheduling.parse_appointment() as of this revision
+APPOINTMENT_FORMATS = (
+    '%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M', '%Y/%m/%d %H:%M',
+    '%Y-%m-%d %I:%M %p', '%d/%m/%Y %I:%M %p',
+)
+DATE_ONLY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+DEFAULT_LENGTH = timedelta(minutes=60)
+BATCH_SIZE = 10000
+
+
+def parse_appointment(value):
+    value = (value or '').strip()
+    if not value or DATE_ONLY.match(value):
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        moment = None
+        for format in APPOINTMENT_FORMATS:
+            try:
+                moment = datetime.strptime(value, format)
+                break
+            except ValueError:
+                continue
+    if moment is None:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(second=0, microsecond=0)
+
+
+def upgrade():
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('appointment_start', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('appointment_end', sa.DateTime(), nullable=True))
+
+    # Existing appointments become one-slot intervals; strings that are not a date and time stay unparsed
+    bind = op.get_bind()
+    bookings = sa.table(
+        'bookings',
+        sa.column('id', sa.Integer),
+        sa.column('appointment', sa.String),
+        sa.column('appointment_start', sa.DateTime),
+        sa.column('appointment_end', sa.DateTime),
+    )
+    update = (
+        bookings.update()
+        .where(bookings.c.id == sa.bindparam('booking_id'))
+        .values(appointment_start=sa.bindparam('start'), appointment_end=sa.bindparam('end'))
+    )
+    parsed = {}  # The same few strings repeat across many bookings
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(bookings.c.id, bookings.c.appointment)
+            .where(bookings.c.id > last_id, bookings.c.appointment.isnot(None))
+            .order_by(bookings.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        params = []
+        for id, appointment in rows:
+            if appointment not in parsed:
+                parsed[appointment] = parse_appointment(appointment)
+            start = parsed[appointment]
+            if start is not None:
+                params.append({'booking_id': id, 'start': start, 'end': start + DEFAULT_LENGTH})
+        if params:
+            bind.execute(update, params)
+
+    op.create_index('ix_bookings_service_appointment', 'bookings', ['service_id', 'appointment_start', 'appointment_end', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bookings_service_appointment', table_name='bookings')
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_column('appointment_end')
+        batch_op.drop_column('appointment_start')
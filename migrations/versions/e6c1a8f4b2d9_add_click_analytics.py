@@ -0,0 +1,55 @@
+"""add click analytics tables
+
+Revision ID: e6c1a8f4b2d9
+Revises: b81f3d5c9a04
+Create Date: 2026-10-18 15:08:51.370915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c1a8f4b2d9'
+down_revision = 'b81f3d5c9a04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('click_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('occurred_at', sa.DateTime(), nullable=False),
+    sa.Column('rolled_up', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_click_events_rolled_up_id', 'click_events', ['rolled_up', 'id'], unique=False)
+    op.create_table('click_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'granularity', 'bucket_start', 'item_id', name='uq_click_rollups_bucket_item')
+    )
+    op.create_table('click_totals',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind')
+    )
+
+    # Start the running totals from the existing per-item counters
+    op.execute("INSERT INTO click_totals (kind, clicks) SELECT 'products', COALESCE(SUM(clicks), 0) FROM products")
+    op.execute("INSERT INTO click_totals (kind, clicks) SELECT 'services', COALESCE(SUM(clicks), 0) FROM services")
+
+
+def downgrade():
+    op.drop_table('click_totals')
+    op.drop_table('click_rollups')
+    op.drop_index('ix_click_events_rolled_up_id', table_name='click_events')
+    op.drop_table('click_events')
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, Integer, Float, Text, MetaData
+from sqlalchemy import Column, String, Integer, Float, Text, MetaData, literal_column
 from sqlalchemy_serializer import SerializerMixin
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, verify_password
+from replicas import RoutingSession
 from datetime import datetime
 
 
@@ -12,8 +13,8 @@ metadata = MetaData(
     }
 )
 
-# Initialize SQLAlchemy
-db = SQLAlchemy(metadata=metadata)
+# Initialize SQLAlchemy; the routing session lets GET handlers read from replicas (see replicas.py)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 
 
 class Admin(db.Model, SerializerMixin):
@@ -27,10 +28,15 @@ class Admin(db.Model, SerializerMixin):
     serialize_rules = ('-password_hash',) 
 
     def set_password(self, password):
-       self.password_hash = generate_password_hash(password, method='sha256')
+       self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)[0]
+
+    def upgrade_password_hash(self, password_hash):
+        # Same password, newer hash parameters: existing tokens stay valid
+        self._password_rehash = True
+        self.password_hash = password_hash
 
     def __repr__(self):
         return f"<Admin(id={self.id}, name={self.name}, email={self.email})>"
@@ -49,10 +55,24 @@ class Product(db.Model, SerializerMixin):
     name = db.Column(String(100), nullable=False, unique=True)  # Unique name
     category_name = db.Column(String(100), nullable=False)
     subcategory_name = db.Column(String(100), nullable=False)
+    category_id = db.Column(Integer, db.ForeignKey('categories.id'), nullable=True)  # Resolved from the names by taxonomy.py
+    subcategory_id = db.Column(Integer, db.ForeignKey('subcategories.id'), nullable=True)
     description = db.Column(Text, nullable=False)
     price = db.Column(Float, nullable=False)
     image_url = db.Column(String(255), nullable=True)
+    image_srcset = db.Column(db.JSON(none_as_null=True), nullable=True)  # Thumbnail and WebP/AVIF srcsets, filled in by images.py
     clicks = db.Column(Integer, default=0)
+    version = db.Column(Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))  # Bumped on every UPDATE
+
+    # Composite indexes backing the keyset-paginated, filtered GET /products
+    __table_args__ = (
+        db.Index('ix_products_category_subcategory_id', 'category_name', 'subcategory_name', 'id'),
+        db.Index('ix_products_subcategory_name_id', 'subcategory_name', 'id'),  # ?subcategory_name= without a category
+        db.Index('ix_products_price_id', 'price', 'id'),
+        db.Index('ix_products_subcategory_id', 'subcategory_id'),
+        # Never reuse a deleted id, so (id, version) identifies one row state forever (see serializers.RowEncoder)
+        {'sqlite_autoincrement': True},
+    )
 
     serialize_rules = ('-clicks',)  # Exclude clicks from serialization
 
@@ -66,8 +86,11 @@ class Product(db.Model, SerializerMixin):
             "description": self.description,
             "category_name": self.category_name,
             "subcategory_name": self.subcategory_name,
+            "category_id": self.category_id,
+            "subcategory_id": self.subcategory_id,
             "price": self.price,
             "image_url": self.image_url,
+            "image_srcset": self.image_srcset,
             "clicks": self.clicks
         }
 
@@ -81,9 +104,24 @@ class Service(db.Model, SerializerMixin):
     price = db.Column(Float, nullable=False)
     category_name = db.Column(String(100), nullable=False)
     subcategory_name = db.Column(String(100), nullable=False)
+    category_id = db.Column(Integer, db.ForeignKey('categories.id'), nullable=True)  # Resolved from the names by taxonomy.py
+    subcategory_id = db.Column(Integer, db.ForeignKey('subcategories.id'), nullable=True)
     before_service_image = db.Column(String(200), nullable=True)  # New field for before service image
     after_service_image = db.Column(String(200), nullable=True)   # New field for after service image
+    before_image_srcset = db.Column(db.JSON(none_as_null=True), nullable=True)  # Thumbnail and WebP/AVIF srcsets, filled in by images.py
+    after_image_srcset = db.Column(db.JSON(none_as_null=True), nullable=True)
     clicks = db.Column(Integer, default=0)
+    version = db.Column(Integer, nullable=False, default=1, server_default='1', onupdate=literal_column('version + 1'))  # Bumped on every UPDATE
+
+    # Composite indexes backing the keyset-paginated, filtered GET /services
+    __table_args__ = (
+        db.Index('ix_services_category_subcategory_id', 'category_name', 'subcategory_name', 'id'),
+        db.Index('ix_services_subcategory_name_id', 'subcategory_name', 'id'),  # ?subcategory_name= without a category
+        db.Index('ix_services_price_id', 'price', 'id'),
+        db.Index('ix_services_subcategory_id', 'subcategory_id'),
+        # Never reuse a deleted id, so (id, version) identifies one row state forever (see serializers.RowEncoder)
+        {'sqlite_autoincrement': True},
+    )
 
     serialize_rules = ('-clicks',)  # Exclude clicks from serialization
 
@@ -98,12 +136,47 @@ class Service(db.Model, SerializerMixin):
             'price': self.price,
             'category_name': self.category_name,
             'subcategory_name': self.subcategory_name,
+            'category_id': self.category_id,
+            'subcategory_id': self.subcategory_id,
             'before_service_image': self.before_service_image,  # Updated key
             'after_service_image': self.after_service_image,    # Updated key
+            'before_image_srcset': self.before_image_srcset,
+            'after_image_srcset': self.after_image_srcset,
             'clicks': self.clicks,
         }
    
 
+class Category(db.Model):
+    __tablename__ = 'categories'
+
+    # Top level of the taxonomy shared by products and services
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+
+    subcategories = db.relationship('Subcategory', backref='category', lazy=True)
+
+    def __repr__(self):
+        return f"<Category(id={self.id}, name={self.name})>"
+
+
+class Subcategory(db.Model):
+    __tablename__ = 'subcategories'
+
+    # Every product and service sits in exactly one subcategory; its counts are kept current on each write
+    id = db.Column(db.Integer, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    service_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.UniqueConstraint('category_id', 'name', name='uq_subcategories_category_id_name'),
+    )
+
+    def __repr__(self):
+        return f"<Subcategory(id={self.id}, category_id={self.category_id}, name={self.name}, product_count={self.product_count}, service_count={self.service_count})>"
+
+
 class Booking(db.Model):
     __tablename__ = 'bookings'
 
@@ -115,9 +188,19 @@ class Booking(db.Model):
     message = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     appointment = db.Column(db.String(25), nullable=True)
+    appointment_start = db.Column(db.DateTime, nullable=True)  # Parsed from appointment; see scheduling.py
+    appointment_end = db.Column(db.DateTime, nullable=True)
     status=db.Column(db.String(255), nullable=True)
     amount_paid=db.Column(db.String(255), nullable=True)
 
+    # Indexes backing the status/date filtered booking listings
+    __table_args__ = (
+        db.Index('ix_bookings_service_status_timestamp', 'service_id', 'status', 'timestamp'),
+        db.Index('ix_bookings_product_status_timestamp', 'product_id', 'status', 'timestamp'),
+        # Overlap and free-slot queries are range scans of this index, which also holds the columns they read
+        db.Index('ix_bookings_service_appointment', 'service_id', 'appointment_start', 'appointment_end', 'status'),
+    )
+
     # Relationships
     product = db.relationship('Product', backref=db.backref('bookings', lazy=True))
     service = db.relationship('Service', backref=db.backref('bookings', lazy=True))
@@ -132,11 +215,86 @@ class Booking(db.Model):
             'message': self.message,
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             'appointment': self.appointment,
+            'appointment_start': self.appointment_start.strftime('%Y-%m-%d %H:%M:%S') if self.appointment_start else None,
+            'appointment_end': self.appointment_end.strftime('%Y-%m-%d %H:%M:%S') if self.appointment_end else None,
             'status': self.status, 
             'amount_paid': self.amount_paid,
         }
 
     def __repr__(self):
         return f'<Booking(id={self.id}, product_id={self.product_id}, service_id={self.service_id}, name={self.name}, phone={self.phone}, message={self.message}, timestamp={self.timestamp} , appointment={self.appointment} , status={self.status}, amount_paid={self.amount_paid} )>'
-    
-    
\ No newline at end of file
+
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+
+    # One row per catalog ('products', 'services'); bumped in the same transaction as every write
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<CatalogVersion(name={self.name}, version={self.version}, updated_at={self.updated_at})>"
+
+
+class ClickEvent(db.Model):
+    __tablename__ = 'click_events'
+
+    # Append-only log written by the click buffer; one row per item per flush
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'products' or 'services'
+    item_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=1)
+    occurred_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    rolled_up = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    __table_args__ = (
+        db.Index('ix_click_events_rolled_up_id', 'rolled_up', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<ClickEvent(id={self.id}, kind={self.kind}, item_id={self.item_id}, count={self.count}, occurred_at={self.occurred_at})>"
+
+
+class ClickRollup(db.Model):
+    __tablename__ = 'click_rollups'
+
+    # Clicks per item per hour/day bucket, maintained from click_events
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    item_id = db.Column(db.Integer, nullable=False)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'granularity', 'bucket_start', 'item_id', name='uq_click_rollups_bucket_item'),
+    )
+
+    def __repr__(self):
+        return f"<ClickRollup(kind={self.kind}, granularity={self.granularity}, bucket_start={self.bucket_start}, item_id={self.item_id}, clicks={self.clicks})>"
+
+
+class ClickTotal(db.Model):
+    __tablename__ = 'click_totals'
+
+    # Running click total per kind, so /total-clicks never sums the catalog tables
+    kind = db.Column(db.String(20), primary_key=True)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ClickTotal(kind={self.kind}, clicks={self.clicks})>"
+
+
+class TokenRevocation(db.Model):
+    __tablename__ = 'token_revocations'
+
+    # Either one token (jti) or every token of an admin issued before revoked_at
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=True)
+    admin_id = db.Column(db.Integer, nullable=True)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)  # After this the revoked tokens are expired anyway
+
+    def __repr__(self):
+        return f"<TokenRevocation(id={self.id}, jti={self.jti}, admin_id={self.admin_id}, revoked_at={self.revoked_at})>"
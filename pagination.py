@@ -0,0 +1,70 @@
+from flask_restful import abort, reqparse
+from models import db
+from serializers import row_encoder
+
+# Page size used when the client does not send ?limit=, and the hard cap
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def listing_parser():
+    """Build a query-string parser shared by the catalog listing endpoints."""
+    parser = reqparse.RequestParser()
+    parser.add_argument('cursor', type=int, location='args')  # Last id of the previous page
+    parser.add_argument('limit', type=int, location='args', default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('category_name', type=str, location='args')
+    parser.add_argument('subcategory_name', type=str, location='args')
+    parser.add_argument('min_price', type=float, location='args')
+    parser.add_argument('max_price', type=float, location='args')
+    parser.add_argument('fields', type=str, location='args')  # Comma separated column names
+    return parser
+
+
+def resolve_fields(fields, allowed):
+    """Turn ?fields=a,b into a tuple of column names, always keeping the id for the cursor."""
+    if not fields:
+        names = list(allowed)
+    else:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            abort(400, message=f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in names:
+        names.insert(0, 'id')
+    return tuple(dict.fromkeys(names))
+
+
+def fetch_page(model, args, allowed_fields):
+    """Return one keyset page of `model` rows as encoded JSON bytes plus the next cursor (or None)."""
+    limit = args.get('limit') or DEFAULT_PAGE_SIZE
+    if limit < 1:
+        abort(400, message="limit must be a positive integer")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    # Only the requested columns (plus the row version) are selected, so no ORM instances are built
+    fields = resolve_fields(args.get('fields'), allowed_fields)
+    query = db.session.query(*[getattr(model, name) for name in fields], model.version)
+
+    if args.get('category_name'):
+        query = query.filter(model.category_name == args['category_name'])
+    if args.get('subcategory_name'):
+        query = query.filter(model.subcategory_name == args['subcategory_name'])
+    if args.get('min_price') is not None:
+        query = query.filter(model.price >= args['min_price'])
+    if args.get('max_price') is not None:
+        query = query.filter(model.price <= args['max_price'])
+    if args.get('cursor') is not None:
+        query = query.filter(model.id > args['cursor'])
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    rows, has_more = rows[:limit], len(rows) > limit
+    next_cursor = rows[-1].id if has_more else None
+    return row_encoder.encode(model.__tablename__, fields, rows), next_cursor
+
+
+def page_headers(next_cursor):
+    """Headers advertising the cursor of the next page, if there is one."""
+    if next_cursor is None:
+        return {}
+    return {'X-Next-Cursor': str(next_cursor)}
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # Fall back to werkzeug's scrypt hashes
+    PasswordHasher = None
+
+# Current hashing parameters; stored hashes made with anything else are upgraded on next login
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', '3'))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', '65536'))  # KiB
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', '1'))
+
+_hasher = None
+
+
+def _argon2():
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST, parallelism=ARGON2_PARALLELISM)
+    return _hasher
+
+
+def hash_password(password):
+    """Hash a password with the current parameters (runs in the calling process)."""
+    if PasswordHasher is not None:
+        return _argon2().hash(password)
+    return generate_password_hash(password, method='scrypt')
+
+
+def verify_password(stored_hash, password):
+    """Return (valid, upgraded_hash); upgraded_hash is set when the stored hash is outdated."""
+    if not stored_hash or password is None:
+        return False, None
+    if PasswordHasher is not None and stored_hash.startswith('$argon2'):
+        try:
+            _argon2().verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, None
+        return True, (hash_password(password) if _argon2().check_needs_rehash(stored_hash) else None)
+
+    # Legacy werkzeug hashes (pbkdf2/scrypt) are re-hashed with argon2 once verified
+    try:
+        valid = check_password_hash(stored_hash, password)
+    except ValueError:
+        return False, None
+    if not valid:
+        return False, None
+    return True, (hash_password(password) if PasswordHasher is not None else None)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool already has its maximum of queued jobs."""
+
+
+class HashingPool:
+    """Runs password hashing on a bounded process pool so request threads are not pinned by it.
+
+    At most `max_pending` jobs may be queued or running per worker; beyond
+    that `HashingBusy` is raised at once so the endpoint can answer 503.
+    With HASH_POOL_WORKERS=0 hashing runs inline on the request thread.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 2
+        self.max_pending = 8
+        self.timeout = 10.0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = int(app.config.get('HASH_POOL_WORKERS', self.workers))
+        self.max_pending = int(app.config.get('HASH_POOL_MAX_PENDING', self.max_pending))
+        self.timeout = float(app.config.get('HASH_TIMEOUT', self.timeout))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['hashing_pool'] = self
+
+    def _pool(self):
+        # Created lazily, and again after a fork, so every gunicorn worker owns its pool. Children come
+        # from a forkserver: forking a threaded (gthread) worker can copy a held lock into the child
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver'))
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # A timed-out job keeps its worker busy, so its slot stays taken until the job really ends
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, stored_hash, password):
+        return self._run(verify_password, stored_hash, password)
+
+
+hashing_pool = HashingPool()
@@ -0,0 +1,142 @@
+import itertools
+import threading
+import time
+from functools import wraps
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+
+PRIMARY_COOKIE = 'db_primary_until'
+# Same pin for cross-origin clients, which do not send cookies unless they fetch with credentials
+PRIMARY_HEADER = 'X-DB-Primary-Until'
+
+
+class ReplicaRouter:
+    """Sends reads of GET handlers decorated with `use_replica` to read replicas.
+
+    Replicas come from DATABASE_REPLICA_URLS and are used round-robin; one
+    that fails a query or a health check is skipped for
+    REPLICA_HEALTH_INTERVAL seconds. Writes always go to the primary, and a
+    client that wrote gets a cookie pinning its reads to the primary for
+    REPLICA_STICKY_SECONDS, so it reads its own writes despite replica lag.
+    The pin is also sent in the X-DB-Primary-Until response header; a
+    cross-origin client that does not send cookies must echo that header
+    on its next requests to read its own writes.
+    """
+
+    def __init__(self, app=None):
+        self.engines = []
+        self.sticky_seconds = 5.0
+        self.health_interval = 10.0
+        self._down_until = {}
+        self._checked_at = {}
+        self._cycle = itertools.cycle([])
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sticky_seconds = float(app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds))
+        self.health_interval = float(app.config.get('REPLICA_HEALTH_INTERVAL', self.health_interval))
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        # SQLite replica URLs should be absolute; Flask-SQLAlchemy's instance folder handling does not apply here
+        self.engines = [
+            create_engine(url, **(options if not url.startswith('sqlite') else {
+                name: value for name, value in options.items() if name in ('pool_pre_ping', 'pool_recycle')
+            }))
+            for url in app.config.get('DATABASE_REPLICA_URLS') or []
+        ]
+        for engine in self.engines:
+            event.listen(engine, 'handle_error', self._query_failed)
+        self._cycle = itertools.cycle(range(len(self.engines)))
+        app.after_request(self._pin_writer)
+        app.extensions['replicas'] = self
+
+    # Request state
+
+    def pinned(self):
+        """True when this request reads from the primary despite `use_replica` (the client wrote recently)."""
+        return bool(g.get('db_pinned'))
+
+    def use_primary(self):
+        """Send the rest of this request's reads to the primary, e.g. before reads that feed a write."""
+        if has_app_context():
+            g.db_replica = False
+
+    def _pin_writer(self, response):
+        if self.engines and g.get('db_wrote'):
+            until = int(time.time() + self.sticky_seconds) + 1
+            response.set_cookie(PRIMARY_COOKIE, str(until), max_age=int(self.sticky_seconds) + 1,
+                                secure=True, httponly=True, samesite='Lax')
+            response.headers[PRIMARY_HEADER] = str(until)
+        return response
+
+    def read_engine(self):
+        """Replica engine for a read in the current request, or None to use the primary."""
+        if not self.engines or not has_app_context() or not g.get('db_replica') or g.get('db_wrote'):
+            return None
+        # One replica per request, so all of its reads (e.g. a catalog version and the rows it describes) see the same lag
+        engine = g.get('db_replica_engine')
+        if engine is None or self._down_until.get(self.engines.index(engine), 0) > time.monotonic():
+            engine = g.db_replica_engine = self._next_healthy()
+        return engine
+
+    # Replica health
+
+    def _next_healthy(self):
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._cycle)
+            if self._down_until.get(index, 0) > now:
+                continue
+            if now - self._checked_at.get(index, 0) > self.health_interval and not self._check(index, now):
+                continue
+            return self.engines[index]
+        return None
+
+    def _check(self, index, now):
+        self._checked_at[index] = now
+        try:
+            with self.engines[index].connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            self._down_until[index] = now + self.health_interval
+            return False
+        return True
+
+    def _query_failed(self, context):
+        index = self.engines.index(context.engine)
+        self._down_until[index] = time.monotonic() + self.health_interval
+
+
+replicas = ReplicaRouter()
+
+
+def use_replica(f):
+    """Decorate a Resource.get so its SELECTs may be served by a read replica."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if replicas.engines:
+            until = request.cookies.get(PRIMARY_COOKIE) or request.headers.get(PRIMARY_HEADER, '')
+            if until.isdigit() and int(until) > time.time():
+                g.db_pinned = True
+            else:
+                g.db_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+class RoutingSession(Session):
+    """Session whose SELECTs go to a replica when the request allows it; everything else hits the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or (clause is not None and not getattr(clause, 'is_select', False))):
+            # A write: later reads in this request, and this client's next reads, stay on the primary
+            if has_app_context():
+                g.db_wrote = True
+        elif bind is None and clause is not None:
+            engine = replicas.read_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
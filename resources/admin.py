@@ -4,11 +4,14 @@ from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     jwt_required,
-    get_jwt_identity,
+    get_jwt,
+    get_current_user,
     # jwt_refresh_token_required,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, Admin
+from password_hashing import HashingBusy, hashing_pool
+from lockout import lockouts
+from auth_cache import identity_cache
 from flask_limiter import Limiter
 # from flask_limiter.util import get_remote_address
 # from flask_talisman import Talisman
@@ -36,30 +39,13 @@ admin_parser.add_argument('email', type=str, required=True, help="Email is requi
 admin_parser.add_argument('password', type=str, required=True, help="Password is required")
 
 # Helper function: lock accounts temporarily after failed attempts
-FAILED_ATTEMPTS = {}
-LOCKOUT_DURATION = datetime.timedelta(minutes=15)
-MAX_FAILED_ATTEMPTS = 5
-
-
+# (tracked by the configured lockout backend so every worker sees the same state)
 def is_account_locked(email):
-    attempt_info = FAILED_ATTEMPTS.get(email)
-    if not attempt_info:
-        return False
-    failed_attempts, last_failed_time = attempt_info
-    if failed_attempts >= MAX_FAILED_ATTEMPTS:
-        if datetime.datetime.now() - last_failed_time < LOCKOUT_DURATION:
-            return True
-        else:
-            # Reset failed attempts after lockout duration
-            FAILED_ATTEMPTS.pop(email)
-    return False
+    return lockouts.is_locked(email)
 
 
 def record_failed_attempt(email):
-    if email in FAILED_ATTEMPTS:
-        FAILED_ATTEMPTS[email] = (FAILED_ATTEMPTS[email][0] + 1, datetime.datetime.now())
-    else:
-        FAILED_ATTEMPTS[email] = (1, datetime.datetime.now())
+    lockouts.record_failure(email)
 
 
 # Admin Login Resource
@@ -76,17 +62,32 @@ class AdminLoginResource(Resource):
             return {"message": "Account is temporarily locked due to multiple failed attempts. Try again later."}, 403
 
         admin = Admin.query.filter_by(email=email).first()
-        if not admin or not check_password_hash(admin.password_hash, password):
+        if not admin:
+            record_failed_attempt(email)
+            return {"message": "Invalid credentials"}, 401
+
+        # Verify on the hashing pool; answer 503 instead of queueing when it is saturated
+        try:
+            valid, upgraded_hash = hashing_pool.verify(admin.password_hash, password)
+        except HashingBusy:
+            return {"message": "Server is busy. Please retry shortly."}, 503, {'Retry-After': '1'}
+        if not valid:
             record_failed_attempt(email)
             return {"message": "Invalid credentials"}, 401
 
+        # Upgrade hashes made with older parameters now that the password is known
+        if upgraded_hash:
+            admin.upgrade_password_hash(upgraded_hash)
+            db.session.commit()
+
         # Reset failed attempts on successful login
-        if email in FAILED_ATTEMPTS:
-            FAILED_ATTEMPTS.pop(email)
+        lockouts.reset(email)
 
         # Generate JWT tokens
-        access_token = create_access_token(identity={"id": admin.id, "email": admin.email}, expires_delta=datetime.timedelta(minutes=15))
-        refresh_token = create_refresh_token(identity={"id": admin.id, "email": admin.email})
+        # The subject must be a string; the email travels as an extra claim
+        claims = {"email": admin.email}
+        access_token = create_access_token(identity=str(admin.id), additional_claims=claims, expires_delta=datetime.timedelta(minutes=15))
+        refresh_token = create_refresh_token(identity=str(admin.id), additional_claims=claims)
         return {"access_token": access_token, "refresh_token": refresh_token}, 200
 
 
@@ -94,7 +95,10 @@ class AdminLoginResource(Resource):
 class AdminRegisterResource(Resource):
     def post(self):
         args = admin_parser.parse_args()
-        hashed_password = generate_password_hash(args['password'], method='argon2')  # Using Argon2 for password hashing
+        try:
+            hashed_password = hashing_pool.hash(args['password'])  # Argon2, off the request thread
+        except HashingBusy:
+            return {"message": "Server is busy. Please retry shortly."}, 503, {'Retry-After': '1'}
 
         admin = Admin(
             name=args['name'],
@@ -110,15 +114,27 @@ class AdminRegisterResource(Resource):
 class TokenRefreshResource(Resource):
     @jwt_required(refresh=True)
     def post(self):
-        current_user = get_jwt_identity()
-        new_access_token = create_access_token(identity=current_user, expires_delta=datetime.timedelta(minutes=15))
+        # Served from the identity cache; deleted admins and revoked tokens never get here
+        admin = get_current_user()
+        new_access_token = create_access_token(identity=str(admin['id']), additional_claims={"email": admin['email']}, expires_delta=datetime.timedelta(minutes=15))
         return {"access_token": new_access_token}, 200
 
 
+# Logout Endpoint: revokes the token it is called with
+class AdminLogoutResource(Resource):
+    @jwt_required(verify_type=False)
+    def post(self):
+        token = get_jwt()
+        identity_cache.revoke_token(token['jti'], datetime.datetime.utcfromtimestamp(token['exp']))
+        db.session.commit()
+        return {"message": "Token revoked"}, 200
+
+
 # Add resources to their respective APIs
 auth_api.add_resource(AdminLoginResource, '/login')
 auth_api.add_resource(AdminRegisterResource, '/register')
 auth_api.add_resource(TokenRefreshResource, '/refresh')
+auth_api.add_resource(AdminLogoutResource, '/logout')
 
 # Add rate limiting and security headers
 # limiter.init_app(auth_bp)
@@ -1,10 +1,19 @@
 from flask import Blueprint, request
 from flask_restful import Api, Resource, reqparse
+from flask_jwt_extended import jwt_required
+from serializers import output_json
 from models import db, Product, Service, Booking
+from pagination import MAX_PAGE_SIZE, page_headers
+from streaming import stream_items
+from replicas import use_replica
+from scheduling import format_datetime, scheduler
+from booking_batch import update_bookings
+from datetime import date, datetime
 
 # Define Blueprint for Booking
 booking_bp = Blueprint('booking', __name__)
 api = Api(booking_bp)
+api.representation('application/json')(output_json)
 
 # Initialize the request parsers
 product_booking_parser = reqparse.RequestParser()
@@ -27,50 +36,154 @@ service_booking_parser.add_argument('message', type=str, required=False)
 service_booking_parser.add_argument('appointment', type=str, required=False)
 service_booking_parser.add_argument('status', type=str, choices=['pending', 'confirmed', 'cancelled'], default='pending')
 service_booking_parser.add_argument('amount_paid', type=float, required=False)
+service_booking_parser.add_argument('duration', type=int, required=False)  # Minutes; one slot when omitted
+
+
+def appointment_arg(value):
+    """reqparse type for appointment datetimes, accepting what parse_appointment() accepts (business timezone)."""
+    moment = scheduler.parse(value)
+    if moment is None:
+        raise ValueError("Expected a date and time, e.g. 2026-10-20 14:30")
+    return moment
+
+
+def appointment_bound(value):
+    """reqparse type for the appointment range filters: a date and time like appointment_arg, or a bare date."""
+    return scheduler.parse(value) or datetime.fromisoformat(value)
+
+
+# Query-string filters shared by the booking listings, e.g. pending bookings of the last 7 days:
+# /services/bookings?status=pending&since=2025-01-01T00:00:00&limit=50
+booking_filter_parser = reqparse.RequestParser()
+booking_filter_parser.add_argument('item_id', type=int, location='args')  # Only bookings of this product/service
+booking_filter_parser.add_argument('status', type=str, location='args', choices=['pending', 'confirmed', 'cancelled'])
+booking_filter_parser.add_argument('since', type=datetime.fromisoformat, location='args')
+booking_filter_parser.add_argument('until', type=datetime.fromisoformat, location='args')
+booking_filter_parser.add_argument('appointment', type=str, location='args')
+booking_filter_parser.add_argument('appointment_after', type=appointment_bound, location='args')  # Appointments starting at or after
+booking_filter_parser.add_argument('appointment_before', type=appointment_bound, location='args')
+booking_filter_parser.add_argument('cursor', type=int, location='args')  # Last booking id of the previous page
+booking_filter_parser.add_argument('limit', type=int, location='args')  # Omit to stream every match
+
+# Rows fetched per round-trip while streaming booking exports
+BOOKINGS_BATCH_SIZE = 1000
+
+# Query strings of the availability endpoints
+availability_parser = reqparse.RequestParser()
+availability_parser.add_argument('date', type=date.fromisoformat, location='args', required=True, help="date must look like 2026-10-20")
+availability_parser.add_argument('duration', type=int, location='args')  # Minutes; one slot when omitted
+
+next_slot_parser = reqparse.RequestParser()
+next_slot_parser.add_argument('after', type=appointment_arg, location='args')  # Defaults to now
+next_slot_parser.add_argument('duration', type=int, location='args')
+
+
+def format_booking_row(row, kind):
+    """Format a joined booking row; `kind` is 'product' or 'service'."""
+    item_id = getattr(row, f'{kind}_id')
+    item_name = getattr(row, f'{kind}_name')
+    if item_name is None:
+        # Older rows stored the item name itself in the id column
+        item_name = item_id if isinstance(item_id, str) else f"Unknown {kind.capitalize()}"
+    return {
+        "id": row.id,
+        f"{kind}_id": item_id,
+        f"{kind}_name": item_name,
+        "name": row.name,
+        "phone": row.phone,
+        "message": row.message,
+        "timestamp": row.timestamp.strftime('%Y-%m-%d %H:%M:%S') if row.timestamp else None,
+        "appointment": row.appointment,
+        "appointment_start": format_datetime(row.appointment_start),
+        "appointment_end": format_datetime(row.appointment_end),
+        "status": row.status,
+        "amount_paid": row.amount_paid
+    }
+
+
+def list_bookings(kind, item_model):
+    """Filtered bookings of one kind joined with the item name, streamed or paginated by id."""
+    args = booking_filter_parser.parse_args()
+    item_column = getattr(Booking, f'{kind}_id')
+
+    # One outer-joined query; (item_id, status, timestamp) indexes serve the filters
+    query = (
+        db.session.query(
+            Booking.id, item_column, item_model.name.label(f'{kind}_name'), Booking.name,
+            Booking.phone, Booking.message, Booking.timestamp, Booking.appointment,
+            Booking.appointment_start, Booking.appointment_end, Booking.status, Booking.amount_paid,
+        )
+        .outerjoin(item_model, item_model.id == item_column)
+        .filter(item_column.isnot(None))
+    )
+    if args.get('item_id') is not None:
+        query = query.filter(item_column == args['item_id'])
+    if args.get('status'):
+        query = query.filter(Booking.status == args['status'])
+    if args.get('since'):
+        query = query.filter(Booking.timestamp >= args['since'])
+    if args.get('until'):
+        query = query.filter(Booking.timestamp < args['until'])
+    if args.get('appointment'):
+        query = query.filter(Booking.appointment == args['appointment'])
+    if args.get('appointment_after'):
+        query = query.filter(Booking.appointment_start >= args['appointment_after'])
+    if args.get('appointment_before'):
+        query = query.filter(Booking.appointment_start < args['appointment_before'])
+    if args.get('cursor') is not None:
+        query = query.filter(Booking.id > args['cursor'])
+    query = query.order_by(Booking.id)
+
+    key = f'{kind}_bookings'
+    if args.get('limit') is None:
+        # Unpaginated export: rows are fetched in batches while the response streams
+        rows = query.yield_per(BOOKINGS_BATCH_SIZE)
+        return stream_items(key, (format_booking_row(row, kind) for row in rows))
+
+    if args['limit'] < 1:
+        return {"message": "limit must be a positive integer"}, 400
+    limit = min(args['limit'], MAX_PAGE_SIZE)
+    rows = query.limit(limit + 1).all()
+    items = [format_booking_row(row, kind) for row in rows[:limit]]
+    next_cursor = items[-1]['id'] if len(rows) > limit else None
+    return stream_items(key, items, headers=page_headers(next_cursor))
+
+
+def product_interval(appointment):
+    """(start, end) of a product booking's appointment; product bookings accept free text, so (None, None) if unparsed."""
+    try:
+        return scheduler.interval(appointment)
+    except ValueError:
+        return None, None
+
+
+def resolve_service_id(value):
+    """Id of the service a booking refers to by id or, as older clients do, by name (None if unknown)."""
+    column = Service.id if str(value).isdigit() else Service.name
+    row = db.session.query(Service.id).filter(column == value).first()
+    return row.id if row else None
+
+
+def slot_conflict(service_id, start, end, duration=None, exclude=None):
+    """409 body if [start, end) overlaps another booking of the service, else None."""
+    scheduler.lock(service_id)
+    conflicts = scheduler.conflicts(service_id, start, end, exclude=exclude)
+    if not conflicts:
+        return None
+    return {
+        "error": "The service is already booked at that time",
+        "conflicts": conflicts,
+        "next_free_slot": format_datetime(scheduler.next_free_slot(service_id, start, duration)),
+    }
+
 
 # Resources
 
 # Get Bookings for Products with Product Name
 class ProductBookingsResource(Resource):
+    @use_replica
     def get(self):
-        # Step 1: Query Booking records where product_id is not None
-        bookings = db.session.query(Booking).filter(Booking.product_id.isnot(None)).all()
-
-        # Step 2: Perform a query to get product names by joining with the Product table
-        product_dict = {}
-        if bookings:
-            # Only query the product table if there are bookings
-            product_names = db.session.query(Product.id, Product.name).all()
-            product_dict = {product.id: product.name for product in product_names}
-
-        # Step 3: Format the booking data as a list of dictionaries including the product name
-        formatted_bookings = []
-        for booking in bookings:
-            # Check if product_id is an integer or a string (product_id as product name directly)
-            if isinstance(booking.product_id, str):
-                # If product_id is a string, use it as product_name
-                product_name = booking.product_id  # product_id is already the product name
-            else:
-                # Else, get the product name from the product_dict (using product_id to look it up)
-                product_name = product_dict.get(booking.product_id, "Unknown Product")
-
-            # Format the booking data
-            formatted_booking = {
-                "id": booking.id,
-                "product_id": booking.product_id,
-                "product_name": product_name,
-                "name": booking.name,
-                "phone": booking.phone,
-                "message": booking.message,
-                "timestamp": booking.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                "appointment": booking.appointment,
-                "status": booking.status,
-                "amount_paid": booking.amount_paid
-            }
-
-            formatted_bookings.append(formatted_booking)
-
-        return {"product_bookings": formatted_bookings}, 200
+        return list_bookings('product', Product)
         
     def post(self):
         # Parse the request body
@@ -80,12 +193,15 @@ class ProductBookingsResource(Resource):
         args = product_booking_parser.parse_args()
 
         # Create a new Booking record
+        appointment_start, appointment_end = product_interval(args.get('appointment'))
         booking = Booking(
             product_id=args['product_id'],
             name=args['name'],
             phone=args['phone'],
             message=args.get('message'),
             appointment=args.get('appointment'),
+            appointment_start=appointment_start,
+            appointment_end=appointment_end,
             status=args['status'],
             amount_paid=args.get('amount_paid')
         )
@@ -120,6 +236,7 @@ class ProductBookingDeleteResource(Resource):
        # Update the appointment field if provided
        if 'appointment' in data:
             booking.appointment = data['appointment']
+            booking.appointment_start, booking.appointment_end = product_interval(data['appointment'])
 
        # Update the status field if provided
        if 'status' in data:
@@ -137,45 +254,9 @@ class ProductBookingDeleteResource(Resource):
 
 # Get Bookings for Services with Service Name
 class ServiceBookingsResource(Resource):
+  @use_replica
   def get(self):
-    # Step 1: Query Booking records where service_id is not None
-    bookings = db.session.query(Booking).filter(Booking.service_id.isnot(None)).all()
-
-    # Step 2: Perform a query to get service names by joining with the Service table
-    service_dict = {}
-    if bookings:
-        # Only query the service table if there are bookings
-        service_names = db.session.query(Service.id, Service.name).all()
-        service_dict = {service.id: service.name for service in service_names}
-
-    # Step 3: Format the booking data as a list of dictionaries including the service name
-    formatted_bookings = []
-    for booking in bookings:
-        # Check if service_id is an integer or a string (service_id as service name directly)
-        if isinstance(booking.service_id, str):
-            # If service_id is a string, use it as service_name
-            service_name = booking.service_id  # service_id is already the service name
-        else:
-            # Else, get the service name from the service_dict (using service_id to look it up)
-            service_name = service_dict.get(booking.service_id, "Unknown Service")
-
-        # Format the booking data
-        formatted_booking = {
-            "id": booking.id,
-            "service_id": booking.service_id,
-            "service_name": service_name,
-            "name": booking.name,
-            "phone": booking.phone,
-            "message": booking.message,
-            "timestamp": booking.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            "appointment": booking.appointment,
-            "status": booking.status,
-            "amount_paid": booking.amount_paid
-        }
-
-        formatted_bookings.append(formatted_booking)
-
-    return {"service_bookings": formatted_bookings}, 200
+    return list_bookings('service', Service)
   
   def post (self):
       # Parse the request body
@@ -183,14 +264,32 @@ class ServiceBookingsResource(Resource):
 
       # Validate the request data
       args = service_booking_parser.parse_args()
+      service_id = resolve_service_id(args['service_id'])
+      if service_id is None:
+          return {"message": "Service not found"}, 404
+
+      # Service appointments must be real times that do not overlap another booking
+      appointment_start = appointment_end = None
+      if args.get('appointment'):
+          try:
+              appointment_start, appointment_end = scheduler.interval(args['appointment'], args.get('duration'))
+          except ValueError as e:
+              return {"error": str(e)}, 400
+          if args['status'] != 'cancelled':
+              conflict = slot_conflict(service_id, appointment_start, appointment_end, args.get('duration'))
+              if conflict:
+                  db.session.rollback()  # Releases the service lock
+                  return conflict, 409
 
       # Create a new Booking record
       booking = Booking(
-          service_id=args['service_id'],
+          service_id=service_id,
           name=args['name'],
           phone=args['phone'],
           message=args.get('message'),
           appointment=args.get('appointment'),
+          appointment_start=appointment_start,
+          appointment_end=appointment_end,
           status=args['status'],
           amount_paid=args.get('amount_paid')
       )
@@ -224,6 +323,11 @@ class ServiceBookingDeleteResource(Resource):
 
        # Update the appointment field if provided
        if 'appointment' in data:
+            try:
+                duration = int(data['duration']) if data.get('duration') is not None else None
+                booking.appointment_start, booking.appointment_end = scheduler.interval(data['appointment'], duration)
+            except (TypeError, ValueError) as e:
+                return {"error": str(e)}, 400
             booking.appointment = data['appointment']
 
        # Update the status field if provided
@@ -234,14 +338,63 @@ class ServiceBookingDeleteResource(Resource):
        if 'amount_paid' in data:
             booking.amount_paid = data['amount_paid']
 
+       # A moved or reinstated booking must not overlap another one
+       if booking.appointment_start and booking.status != 'cancelled' and ('appointment' in data or 'status' in data):
+            duration = int((booking.appointment_end - booking.appointment_start).total_seconds() // 60)
+            conflict = slot_conflict(booking.service_id, booking.appointment_start, booking.appointment_end, duration, exclude=booking.id)
+            if conflict:
+                db.session.rollback()
+                return conflict, 409
+
        # Commit the changes to the database
        db.session.commit()
 
        return {"message": "Booking updated successfully"}, 200
 
+
+class ServiceAvailabilityResource(Resource):
+    @use_replica
+    def get(self, service_id):
+        # Slots of one day on the slot grid, each marked available or not
+        args = availability_parser.parse_args()
+        if resolve_service_id(service_id) is None:
+            return {"message": "Service not found"}, 404
+        try:
+            slots = scheduler.day_slots(service_id, args['date'], args.get('duration'))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return {"service_id": service_id, "date": args['date'].isoformat(), "slots": slots}, 200
+
+
+class ServiceNextSlotResource(Resource):
+    @use_replica
+    def get(self, service_id):
+        args = next_slot_parser.parse_args()
+        if resolve_service_id(service_id) is None:
+            return {"message": "Service not found"}, 404
+        after = args.get('after') or scheduler.now()
+        try:
+            start = scheduler.next_free_slot(service_id, after, args.get('duration'))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if start is None:
+            return {"message": f"No free slot in the next {scheduler.horizon_days} days"}, 404
+        end = start + scheduler.length(args.get('duration'))
+        return {"service_id": service_id, "start": format_datetime(start), "end": format_datetime(end)}, 200
+
+class BookingBatchResource(Resource):
+    @jwt_required()
+    def patch(self):
+        # Many bookings of either kind at once, e.g. end-of-day reconciliation:
+        # {"updates": [{"id": 1, "status": "confirmed", "amount_paid": 1500}, {"id": 2, "status": "cancelled"}]}
+        return update_bookings(request.get_json(silent=True))
+
 # Add Resources to the API
 api.add_resource(ProductBookingsResource, '/products/bookings', endpoint='product_bookings')
 api.add_resource(ServiceBookingsResource, '/services/bookings', endpoint='service_bookings')
+api.add_resource(ServiceAvailabilityResource, '/services/<int:service_id>/availability', endpoint='service_availability')
+api.add_resource(ServiceNextSlotResource, '/services/<int:service_id>/next-slot', endpoint='service_next_slot')
+api.add_resource(BookingBatchResource, '/bookings/batch', endpoint='booking_batch')
 
 # Add delete resource with booking_id to delete specific booking
 api.add_resource(ProductBookingDeleteResource, '/products/bookings/<int:booking_id>', endpoint='delete_product_booking')
@@ -1,44 +1,59 @@
 from flask import Blueprint, request, jsonify, redirect
-from flask_restful import Api, Resource
+from flask_restful import Api, Resource, reqparse
+from serializers import output_json
 from models import db, Product, Service,Booking
+from click_buffer import click_buffer
+from response_cache import response_cache
+from replicas import use_replica
+from click_analytics import MAX_WINDOW_HOURS, click_totals, top_clicked
 
 # Define Blueprint
 clicks_bp = Blueprint('clicks', __name__)
 api = Api(clicks_bp)
+api.representation('application/json')(output_json)
+
+MISSING_INFO_ERROR = "Missing required information. Name, phone, and message are required."
+MAX_BATCH_EVENTS = 500
+
+
+def missing_booking_info(data):
+    return not data.get('name') or not data.get('phone') or not data.get('message')
+
+
+def build_whatsapp_url(kind, item, name, phone, message):
+    # Construct the WhatsApp URL including the item details and customer information
+    return f"https://wa.me/+254722669912?text=I%20am%20interested%20in%20the%20{kind}%20'{item.name}'%20priced%20at%20{item.price}%0AName:%20{name}%0APhone:%20{phone}%0AMessage:%20{message}"
+
 
 # Click Tracker for Product Booking
 # @limiter.exempt
 class ProductClickResource(Resource):
     def post(self, product_id):
+        # Validate customer information before touching the database
+        data = request.get_json(silent=True) or {}
+        if missing_booking_info(data):
+            return {"error": MISSING_INFO_ERROR}, 400
+
         # Fetch product by ID
         product = Product.query.get_or_404(product_id)
-        product.clicks += 1
-        db.session.commit()
-
-        # Fetch customer information from the request
-        name = request.json.get('name')
-        phone = request.json.get('phone')
-        message = request.json.get('message')
-
-        # Check if all required fields are provided
-        if not name or not phone or not message:
-            return jsonify({"error": "Missing required information. Name, phone, and message are required."}), 400
 
-        # Store booking details in the database
-        booking = Booking(product_id=product.id, name=name, phone=phone, message=message)
+        # Store booking details in the database; this is the only commit of the request
+        booking = Booking(product_id=product.id, name=data['name'], phone=data['phone'], message=data['message'])
         db.session.add(booking)
         db.session.commit()
+        click_buffer.add('products', product.id)  # Written behind in batches
 
-        # Construct the WhatsApp URL including the product details and customer information
-        whatsapp_url = f"https://wa.me/+254722669912?text=I%20am%20interested%20in%20the%20product%20'{product.name}'%20priced%20at%20{product.price}%0AName:%20{name}%0APhone:%20{phone}%0AMessage:%20{message}"
-
+        whatsapp_url = build_whatsapp_url('product', product, data['name'], data['phone'], data['message'])
         return jsonify({"whatsapp_url": whatsapp_url, "message": "Booking details stored successfully."})
 
 
 # @limiter.exempt
 class AllProductClicksResource(Resource):
+    @use_replica
+    @response_cache.cached('products')
     def get(self):
-        products = Product.query.all()
+        # Product.clicks is the per-item aggregate maintained by the click buffer
+        products = db.session.query(Product.id, Product.name, Product.clicks).order_by(Product.id).all()
         product_clicks = [{"product_id": product.id, "name": product.name, "clicks": product.clicks} for product in products]
         return {"products": product_clicks}, 200
 
@@ -46,52 +61,135 @@ class AllProductClicksResource(Resource):
 # @limiter.exempt
 class ServiceClickResource(Resource):
     def post(self, service_id):
+        # Validate customer information before touching the database
+        data = request.get_json(silent=True) or {}
+        if missing_booking_info(data):
+            return {"error": MISSING_INFO_ERROR}, 400
+
         # Fetch service by ID
         service = Service.query.get_or_404(service_id)
-        service.clicks += 1
-        db.session.commit()
-
-        # Fetch customer information from the request
-        name = request.json.get('name')
-        phone = request.json.get('phone')
-        message = request.json.get('message')
-
-        # Check if all required fields are provided
-        if not name or not phone or not message:
-            return jsonify({"error": "Missing required information. Name, phone, and message are required."}), 400
 
-        # Store booking details in the database
-        booking = Booking(service_id=service.id, name=name, phone=phone, message=message)
+        # Store booking details in the database; this is the only commit of the request
+        booking = Booking(service_id=service.id, name=data['name'], phone=data['phone'], message=data['message'])
         db.session.add(booking)
         db.session.commit()
+        click_buffer.add('services', service.id)  # Written behind in batches
 
-        # Construct the WhatsApp URL including the service details and customer information
-        whatsapp_url = f"https://wa.me/+254722669912?text=I%20am%20interested%20in%20the%20service%20'{service.name}'%20priced%20at%20{service.price}%0AName:%20{name}%0APhone:%20{phone}%0AMessage:%20{message}"
-
+        whatsapp_url = build_whatsapp_url('service', service, data['name'], data['phone'], data['message'])
         return jsonify({"whatsapp_url": whatsapp_url, "message": "Booking details stored successfully."})
 
 
 # @limiter.exempt
 class AllServiceClicksResource(Resource):
+    @use_replica
+    @response_cache.cached('services')
     def get(self):
-        services = Service.query.all()
+        # Service.clicks is the per-item aggregate maintained by the click buffer
+        services = db.session.query(Service.id, Service.name, Service.clicks).order_by(Service.id).all()
         service_clicks = [{"service_id": service.id, "name": service.name, "clicks": service.clicks} for service in services]
         return {"services": service_clicks}, 200
 
 # API for Total Clicks
 class TotalClicksResource(Resource):
+    @use_replica
+    @response_cache.cached('products', 'services')
     def get(self):
-        total_product_clicks = db.session.query(db.func.sum(Product.clicks)).scalar() or 0
-        total_service_clicks = db.session.query(db.func.sum(Service.clicks)).scalar() or 0
+        # Read from the running totals instead of summing the catalog tables
+        totals = click_totals()
+        total_product_clicks = totals['products']
+        total_service_clicks = totals['services']
         return {
             "total_product_clicks": total_product_clicks,
             "total_service_clicks": total_service_clicks,
             "total_clicks": total_product_clicks + total_service_clicks
         }, 200
 
+# Most clicked products or services over a recent window, answered from the rollup buckets
+top_clicks_parser = reqparse.RequestParser()
+top_clicks_parser.add_argument('kind', type=str, location='args', choices=['products', 'services'], default='products')
+top_clicks_parser.add_argument('hours', type=int, location='args', default=24)
+top_clicks_parser.add_argument('limit', type=int, location='args', default=10)
+
+class TopClicksResource(Resource):
+    @use_replica
+    @response_cache.cached('click_rollups')
+    def get(self):
+        args = top_clicks_parser.parse_args()
+        if args['hours'] < 1 or args['limit'] < 1:
+            return {"error": "hours and limit must be positive integers."}, 400
+        if args['hours'] > MAX_WINDOW_HOURS:
+            return {"error": f"hours must be at most {MAX_WINDOW_HOURS}."}, 400
+        return top_clicked(args['kind'], args['hours'], min(args['limit'], 100)), 200
+
+
+def valid_event_id(event, field):
+    # JSON may carry any type here; only real integers (not booleans) can be looked up
+    value = event.get(field) if isinstance(event, dict) else None
+    return isinstance(value, int) and not isinstance(value, bool) and bool(value)
+
+
+# Batch of click+booking events, e.g. queued offline by kiosk clients
+class ClickBatchResource(Resource):
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return {"error": "A non-empty list of events is required."}, 400
+        if len(events) > MAX_BATCH_EVENTS:
+            return {"error": f"At most {MAX_BATCH_EVENTS} events are accepted per batch."}, 400
+
+        # Step 1: Look up every referenced product and service with one query each
+        product_ids = {event['product_id'] for event in events if valid_event_id(event, 'product_id')}
+        service_ids = {event['service_id'] for event in events if valid_event_id(event, 'service_id')}
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+        services = {s.id: s for s in Service.query.filter(Service.id.in_(service_ids)).all()} if service_ids else {}
+
+        # Step 2: Validate each event and stage its booking
+        results = []
+        clicks = []
+        for index, event in enumerate(events):
+            if not isinstance(event, dict) or bool(event.get('product_id')) == bool(event.get('service_id')):
+                results.append({"index": index, "error": "Exactly one of product_id or service_id is required."})
+                continue
+            if not (valid_event_id(event, 'product_id') or valid_event_id(event, 'service_id')):
+                results.append({"index": index, "error": "product_id and service_id must be integers."})
+                continue
+            if missing_booking_info(event):
+                results.append({"index": index, "error": MISSING_INFO_ERROR})
+                continue
+
+            if event.get('product_id'):
+                kind, item = 'product', products.get(event['product_id'])
+                booking = Booking(product_id=event['product_id'])
+            else:
+                kind, item = 'service', services.get(event['service_id'])
+                booking = Booking(service_id=event['service_id'])
+            if item is None:
+                results.append({"index": index, "error": f"{kind.capitalize()} not found."})
+                continue
+
+            booking.name, booking.phone, booking.message = event['name'], event['phone'], event['message']
+            db.session.add(booking)
+            clicks.append((kind + 's', item.id))
+            results.append({
+                "index": index,
+                "whatsapp_url": build_whatsapp_url(kind, item, event['name'], event['phone'], event['message']),
+            })
+
+        # Step 3: Write all valid bookings in a single transaction
+        if clicks:
+            db.session.commit()
+            for kind, id in clicks:
+                click_buffer.add(kind, id)
+
+        return {"created": len(clicks), "results": results}, 200
+
+
 # Add Resources to the API
 api.add_resource(ProductClickResource, '/products/<int:product_id>/clicks')
 api.add_resource(AllProductClicksResource, '/products/clicks')
 api.add_resource(ServiceClickResource, '/services/<int:service_id>/clicks')
 api.add_resource(AllServiceClicksResource, '/services/clicks')
 api.add_resource(TotalClicksResource, '/total-clicks')
+api.add_resource(ClickBatchResource, '/clicks/batch')
+api.add_resource(TopClicksResource, '/clicks/top')
@@ -0,0 +1,28 @@
+from flask import Blueprint
+from flask_restful import Api, Resource, inputs, reqparse
+from response_cache import response_cache
+from replicas import use_replica
+from serializers import output_json
+from taxonomy import category_tree
+
+# Define Blueprint
+categories_bp = Blueprint('categories', __name__)
+api = Api(categories_bp)
+api.representation('application/json')(output_json)
+
+# Request parsers
+category_parser = reqparse.RequestParser()
+category_parser.add_argument('include_empty', type=inputs.boolean, location='args', default=False)  # Keep nodes without items
+
+
+# Resources
+class CategoryTreeResource(Resource):
+    @use_replica
+    @response_cache.cached('products', 'services')
+    def get(self):
+        args = category_parser.parse_args()
+        return category_tree(args['include_empty']), 200
+
+
+# Add Resources to the API
+api.add_resource(CategoryTreeResource, '/categories')
@@ -1,45 +1,25 @@
-import os
-import uuid
-from flask import Blueprint, request, current_app, jsonify
+from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource, reqparse
-from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError
 from models import db, Product
-from functools import wraps
-import jwt
+from response_cache import response_cache
+from replicas import use_replica
+from uploads import upload_store, UploadRejected
+from images import image_pipeline
+from search_index import search_index
+from taxonomy import assign_category, release_category
+from catalog_version import bump_catalog_version, conditional_get
+from pagination import listing_parser, fetch_page, page_headers
+from serializers import json_response, output_json
+from catalog_io import export_catalog, import_catalog
+from flask_jwt_extended import jwt_required
 
 # Define Blueprint
 products_bp = Blueprint('products', __name__)
 api = Api(products_bp)
+api.representation('application/json')(output_json)
 
 
-# # Your app's secret key
-# SECRET_KEY = 'your_secret_key'
-
-# def token_required(f):
-#     @wraps(f)
-#     def decorated(*args, **kwargs):
-#         token = None
-#         # Check for the token in the request headers
-#         if 'Authorization' in request.headers:
-#             token = request.headers['Authorization'].split("Bearer ")[-1]
-
-#         if not token:
-#             return jsonify({"message": "Token is missing"}), 401
-
-#         try:
-#             # Decode the token
-#             data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-#             current_user_id = data['user_id']  # Retrieve user info from token
-#         except jwt.ExpiredSignatureError:
-#             return jsonify({"message": "Token has expired"}), 401
-#         except jwt.InvalidTokenError:
-#             return jsonify({"message": "Invalid token"}), 401
-
-#         # Pass the current user ID to the route
-#         return f(current_user_id=current_user_id, *args, **kwargs)
-#     return decorated
-
 # Request parsers
 product_parser = reqparse.RequestParser()
 product_parser.add_argument('name', type=str, required=True, help="Name is required")
@@ -48,23 +28,21 @@ product_parser.add_argument('subcategory_name', type=str, required=True)
 product_parser.add_argument('description', type=str, required=True)
 product_parser.add_argument('price', type=float, required=True)
 product_parser.add_argument('image_url', type=str)  # For URL-based images
-# '''uploads/products/files'''
-
-# Helper function for saving uploaded files
-def save_uploaded_files(file):
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads/products')
-    os.makedirs(upload_folder, exist_ok=True)
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
-    return file_path
 
+# Query-string parser for GET /products (cursor, filters and ?fields= projection)
+product_list_parser = listing_parser()
+PRODUCT_FIELDS = ('id', 'name', 'description', 'category_name', 'subcategory_name', 'category_id', 'subcategory_id', 'price', 'image_url', 'image_srcset', 'clicks')
+# '''uploads/products/files'''
 
 # Resources
 class ProductListResource(Resource):
+    @use_replica
+    @conditional_get('products')
+    @response_cache.cached('products')
     def get(self):
-        products = Product.query.all()
-        return [product.to_dict() for product in products], 200
+        args = product_list_parser.parse_args()
+        body, next_cursor = fetch_page(Product, args, PRODUCT_FIELDS)
+        return json_response(body, 200, page_headers(next_cursor))
     # @token_required
     def post(self):
         args = product_parser.parse_args()
@@ -72,7 +50,10 @@ class ProductListResource(Resource):
         image_url = None
 
         if uploaded_file:
-            image_url = save_uploaded_files(uploaded_file)  # Save file and get path
+            try:
+                image_url = upload_store.url(upload_store.save(uploaded_file))  # Store file and get its URL
+            except UploadRejected as e:
+                return {"error": str(e)}, 400
         elif args.get('image_url'):
             image_url = args.get('image_url')  # Use provided URL
 
@@ -91,14 +72,22 @@ class ProductListResource(Resource):
         )
 
         try:
+            assign_category('products', product)  # Sets category_id/subcategory_id and updates the counts
             db.session.add(product)
+            search_index.index('products', product)
+            bump_catalog_version('products')
             db.session.commit()
+            response_cache.invalidate('products')
+            image_pipeline.submit(image_url)  # Thumbnails and WebP/AVIF sizes are filled in later
             return product.to_dict(), 201
         except IntegrityError:
             db.session.rollback()
             return jsonify({"error": "Failed to create product due to a database constraint"}), 400
 
 class ProductResource(Resource):
+    @use_replica
+    @conditional_get('products')
+    @response_cache.cached('products')
     def get(self, id):
         product = Product.query.get_or_404(id)
         return product.to_dict(), 200
@@ -110,7 +99,10 @@ class ProductResource(Resource):
         image_url = product.image_url  # Keep existing value unless a new one is provided
 
         if uploaded_file:
-            image_url = save_uploaded_files(uploaded_file)
+            try:
+                image_url = upload_store.url(upload_store.save(uploaded_file))
+            except UploadRejected as e:
+                return {"error": str(e)}, 400
         elif args.get('image_url'):
             image_url = args.get('image_url')
 
@@ -123,10 +115,18 @@ class ProductResource(Resource):
         product.subcategory_name = args['subcategory_name']
         product.description = args['description']
         product.price = args['price']
+        if image_url != product.image_url:
+            product.image_srcset = None  # The old image's variants no longer apply
         product.image_url = image_url
 
         try:
+            assign_category('products', product)
+            search_index.index('products', product)
+            bump_catalog_version('products')
             db.session.commit()
+            response_cache.invalidate('products')
+            if uploaded_file:
+                image_pipeline.submit(image_url)
             return product.to_dict(), 200
         except IntegrityError:
             db.session.rollback()
@@ -134,10 +134,27 @@ class ProductResource(Resource):
 
     def delete(self, id):
         product = Product.query.get_or_404(id)
+        search_index.remove('products', product.id)
+        release_category('products', product)
         db.session.delete(product)
+        bump_catalog_version('products')
         db.session.commit()
+        response_cache.invalidate('products')
         return '', 204
 
+class ProductImportResource(Resource):
+    @jwt_required()
+    def post(self):
+        # Body is CSV (text/csv) or NDJSON (application/x-ndjson); rows are upserted by name
+        return import_catalog('products')
+
+class ProductExportResource(Resource):
+    @use_replica
+    def get(self):
+        return export_catalog('products')
+
 # Add Resources to the API
 api.add_resource(ProductListResource, '/products')
 api.add_resource(ProductResource, '/products/<int:id>')
+api.add_resource(ProductImportResource, '/products/import')
+api.add_resource(ProductExportResource, '/products/export')
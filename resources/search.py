@@ -0,0 +1,99 @@
+from flask import Blueprint
+from flask_restful import Api, Resource, reqparse
+from models import db
+from response_cache import response_cache
+from replicas import use_replica
+from pagination import page_headers
+from search_index import SEARCH_MODELS, query_tokens, search_index
+from serializers import output_json
+
+# Define Blueprint
+search_bp = Blueprint('search', __name__)
+api = Api(search_bp)
+api.representation('application/json')(output_json)
+
+# Page sizes, and how deep ranked results can be paged before the query has to be refined
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_SEARCH_OFFSET = 1000
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+
+# Columns returned with each hit, besides its kind and score
+RESULT_FIELDS = {
+    'products': ('id', 'name', 'category_name', 'subcategory_name', 'price', 'image_url', 'image_srcset'),
+    'services': (
+        'id', 'name', 'category_name', 'subcategory_name', 'price',
+        'before_service_image', 'after_service_image', 'before_image_srcset', 'after_image_srcset',
+    ),
+}
+
+# Request parsers
+search_parser = reqparse.RequestParser()
+search_parser.add_argument('q', type=str, location='args', required=True, help="q is required")
+search_parser.add_argument('type', type=str, location='args', choices=tuple(SEARCH_MODELS), help="type must be products or services")
+search_parser.add_argument('cursor', type=int, location='args')  # Offset of the next page, from X-Next-Cursor
+search_parser.add_argument('limit', type=int, location='args', default=DEFAULT_SEARCH_LIMIT)
+
+suggest_parser = reqparse.RequestParser()
+suggest_parser.add_argument('q', type=str, location='args', required=True, help="q is required")
+suggest_parser.add_argument('type', type=str, location='args', choices=tuple(SEARCH_MODELS), help="type must be products or services")
+suggest_parser.add_argument('limit', type=int, location='args', default=DEFAULT_SUGGEST_LIMIT)
+
+
+def load_hits(hits, fields):
+    """Fetch `fields` for ranked (kind, id, score) hits, keeping their order."""
+    rows = {}
+    for kind, model in SEARCH_MODELS.items():
+        ids = [id for hit_kind, id, _ in hits if hit_kind == kind]
+        if ids:
+            columns = [getattr(model, name) for name in fields[kind]]
+            rows.update({(kind, row.id): row for row in db.session.query(*columns).filter(model.id.in_(ids))})
+    results = []
+    for kind, id, score in hits:
+        row = rows.get((kind, id))
+        if row is not None:  # Deleted since the index was read
+            results.append({'kind': kind, **row._asdict(), 'score': score})
+    return results
+
+
+# Resources
+class SearchResource(Resource):
+    @use_replica
+    @response_cache.cached('products', 'services')
+    def get(self):
+        args = search_parser.parse_args()
+        tokens = query_tokens(args['q'])
+        if not tokens:
+            return {"error": "q must contain at least one letter or digit"}, 400
+        limit, offset = args['limit'], args['cursor'] or 0
+        if limit < 1 or offset < 0:
+            return {"error": "limit must be positive and cursor not negative"}, 400
+        if offset > MAX_SEARCH_OFFSET:
+            return {"error": f"Results past {MAX_SEARCH_OFFSET} are not paged; refine the query"}, 400
+        limit = min(limit, MAX_SEARCH_LIMIT)
+
+        kinds = [args['type']] if args['type'] else list(SEARCH_MODELS)
+        # The last word also matches as a prefix, so results follow the query as it is typed
+        hits = search_index.search(kinds, tokens, limit + 1, offset)
+        hits, has_more = hits[:limit], len(hits) > limit
+        return load_hits(hits, RESULT_FIELDS), 200, page_headers(offset + limit if has_more else None)
+
+
+class SuggestResource(Resource):
+    @use_replica
+    @response_cache.cached('products', 'services')
+    def get(self):
+        args = suggest_parser.parse_args()
+        tokens = query_tokens(args['q'])
+        if not tokens:
+            return [], 200
+        limit = min(max(args['limit'], 1), MAX_SUGGEST_LIMIT)
+        kinds = [args['type']] if args['type'] else list(SEARCH_MODELS)
+        hits = search_index.search(kinds, tokens, limit, names_only=True)
+        return load_hits(hits, {kind: ('id', 'name') for kind in SEARCH_MODELS}), 200
+
+
+# Add Resources to the API
+api.add_resource(SearchResource, '/search')
+api.add_resource(SuggestResource, '/search/suggest')
@@ -1,12 +1,22 @@
-import os
-from flask import Blueprint, request, current_app
+from flask import Blueprint, request
 from flask_restful import Api, Resource, reqparse
-from werkzeug.utils import secure_filename
 from models import db, Service
+from response_cache import response_cache
+from replicas import use_replica
+from uploads import upload_store, UploadRejected
+from images import image_pipeline
+from search_index import search_index
+from taxonomy import assign_category, release_category
+from catalog_version import bump_catalog_version, conditional_get
+from pagination import listing_parser, fetch_page, page_headers
+from serializers import json_response, output_json
+from catalog_io import export_catalog, import_catalog
+from flask_jwt_extended import jwt_required
 
 # Define Blueprint
 services_bp = Blueprint('services', __name__)
 api = Api(services_bp)
+api.representation('application/json')(output_json)
 
 # Request parsers
 service_parser = reqparse.RequestParser()
@@ -18,43 +28,40 @@ service_parser.add_argument('subcategory_name', type=str, required=True)
 service_parser.add_argument('before_service_image', type=str)  # Used for URL-based images
 service_parser.add_argument('after_service_image', type=str) # Used for URL-
 
-# Helper function for saving uploaded files
-def save_uploaded_file(file):
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-    os.makedirs(upload_folder, exist_ok=True)
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
-    return file_path
-
-def save_after_file(file):
-    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads/after')
-    os.makedirs(upload_folder, exist_ok=True)
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(upload_folder, filename)
-    file.save(file_path)
-    return file_path
+# Query-string parser for GET /services (cursor, filters and ?fields= projection)
+service_list_parser = listing_parser()
+SERVICE_FIELDS = ('id', 'name', 'description', 'price', 'category_name', 'subcategory_name', 'category_id', 'subcategory_id', 'before_service_image', 'after_service_image', 'before_image_srcset', 'after_image_srcset', 'clicks')
+
+def store_service_images(before_file, after_file):
+    """Store the uploaded before/after images and return their URLs (None where no file was sent)."""
+    return (
+        upload_store.url(upload_store.save(before_file)) if before_file else None,
+        upload_store.url(upload_store.save(after_file)) if after_file else None,
+    )
 
 # Resources
 class ServiceListResource(Resource):
+    @use_replica
+    @conditional_get('services')
+    @response_cache.cached('services')
     def get(self):
-        services = Service.query.all()
-        return [service.to_dict() for service in services], 200
+        args = service_list_parser.parse_args()
+        body, next_cursor = fetch_page(Service, args, SERVICE_FIELDS)
+        return json_response(body, 200, page_headers(next_cursor))
 
     def post(self):
         args = service_parser.parse_args()
         uploaded_file = request.files.get('file')  # Check if a file is uploaded
-        before_service_image = None
-        after_service_image = None
+        after_file = request.files.get('after_file') or uploaded_file  # A single file is used for both images
+        try:
+            before_service_image, after_service_image = store_service_images(uploaded_file, after_file)
+        except UploadRejected as e:
+            return {"error": str(e)}, 400
 
-        if uploaded_file:
-            before_service_image = save_uploaded_file(uploaded_file)
-        elif args.get('before_service_image'):
+        if not before_service_image and args.get('before_service_image'):
             before_service_image = args.get('before_service_image')  # Use provided URL
 
-        if uploaded_file:
-            after_service_image = save_after_file(uploaded_file)
-        elif args.get('after_service_image'):
+        if not after_service_image and args.get('after_service_image'):
             after_service_image = args.get('after_service_image')  # Use provided URL
         
 
@@ -68,11 +75,21 @@ class ServiceListResource(Resource):
             before_service_image=before_service_image,
             after_service_image=after_service_image  
         )
+        assign_category('services', service)  # Sets category_id/subcategory_id and updates the counts
         db.session.add(service)
+        search_index.index('services', service)
+        bump_catalog_version('services')
         db.session.commit()
+        response_cache.invalidate('services')
+        # Thumbnails and WebP/AVIF sizes are filled in later
+        for key in {before_service_image, after_service_image}:
+            image_pipeline.submit(key)
         return service.to_dict(), 201
 
 class ServiceResource(Resource):
+    @use_replica
+    @conditional_get('services')
+    @response_cache.cached('services')
     def get(self, id):
         service = Service.query.get_or_404(id)
         return service.to_dict(), 200
@@ -81,18 +98,14 @@ class ServiceResource(Resource):
         service = Service.query.get_or_404(id)
         args = service_parser.parse_args()
         uploaded_file = request.files.get('file')
-        before_service_image = service.before_service_image  # Keep existing value if no new file or URL provided
-        after_service_image = service.after_service_image  # Keep existing value if no new file or URL provided
-
-        if uploaded_file:
-            before_service_image = save_uploaded_file(uploaded_file)
-        elif args.get('before_service_image'):
-            before_service_image = args.get('before_service_image')# Use provided URL
-
-        if uploaded_file:
-            after_service_image = save_after_file(uploaded_file)
-        elif args.get('after_service_image'):
-            after_service_image = args.get('after_service_image')  # Use provided URL
+        after_file = request.files.get('after_file') or uploaded_file
+        try:
+            before_url, after_url = store_service_images(uploaded_file, after_file)
+        except UploadRejected as e:
+            return {"error": str(e)}, 400
+        # Keep existing values if no new file or URL provided
+        before_service_image = before_url or args.get('before_service_image') or service.before_service_image
+        after_service_image = after_url or args.get('after_service_image') or service.after_service_image
 
         
 
@@ -103,17 +116,45 @@ class ServiceResource(Resource):
         service.price = args['price']
         service.category_name = args['category_name']
         service.subcategory_name = args['subcategory_name']
+        # The old images' variants no longer apply
+        if before_service_image != service.before_service_image:
+            service.before_image_srcset = None
+        if after_service_image != service.after_service_image:
+            service.after_image_srcset = None
         service.before_service_image = before_service_image
         service.after_service_image = after_service_image
+        assign_category('services', service)
+        search_index.index('services', service)
+        bump_catalog_version('services')
         db.session.commit()
+        response_cache.invalidate('services')
+        for url in {before_url, after_url}:
+            image_pipeline.submit(url)
         return service.to_dict(), 200
 
     def delete(self, id):
         service = Service.query.get_or_404(id)
+        search_index.remove('services', service.id)
+        release_category('services', service)
         db.session.delete(service)
+        bump_catalog_version('services')
         db.session.commit()
+        response_cache.invalidate('services')
         return '', 204
 
+class ServiceImportResource(Resource):
+    @jwt_required()
+    def post(self):
+        # Body is CSV (text/csv) or NDJSON (application/x-ndjson); rows are upserted by name
+        return import_catalog('services')
+
+class ServiceExportResource(Resource):
+    @use_replica
+    def get(self):
+        return export_catalog('services')
+
 # Add Resources to the API
 api.add_resource(ServiceListResource, '/services')
 api.add_resource(ServiceResource, '/services/<int:id>')
+api.add_resource(ServiceImportResource, '/services/import')
+api.add_resource(ServiceExportResource, '/services/export')
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, request
+from flask_restful.utils import unpack
+from replicas import replicas
+
+
+class MemoryBackend:
+    """Process-local LRU store with per-entry expiry."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def generations(self, namespaces):
+        with self._lock:
+            return [self._generations.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            # Entries of older generations can never be hit again, so drop them now
+            stale = [key for key in self._entries if f"|{namespace}:" in key]
+            for key in stale:
+                del self._entries[key]
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Store shared by all workers on any Redis-compatible client (get/set/mget/incr)."""
+
+    def __init__(self, client, prefix='response-cache:'):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0  # Eviction is left to the server's maxmemory policy
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def generations(self, namespaces):
+        values = self.client.mget([f"{self.prefix}generation:{namespace}" for namespace in namespaces])
+        return [int(value or 0) for value in values]
+
+    def bump(self, namespace):
+        self.client.incr(f"{self.prefix}generation:{namespace}")
+
+    def size(self):
+        return None
+
+
+class ResponseCache:
+    """Caches successful Resource.get results keyed by namespace generation and request path.
+
+    Writes call `invalidate(namespace)`, which bumps the namespace generation
+    so every key built from the old generation stops matching. With the
+    in-memory backend that only reaches the local worker; set CACHE_REDIS_URL
+    to share entries and invalidations between workers. Either way an entry
+    lives at most its TTL.
+    """
+
+    def __init__(self, app=None):
+        self.backend = MemoryBackend()
+        self.default_ttl = 30
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_ttl = int(app.config.get('CACHE_DEFAULT_TTL', self.default_ttl))
+        self.enabled = self.default_ttl > 0
+        redis_url = app.config.get('CACHE_REDIS_URL')
+        if redis_url:
+            import redis  # Only needed when a shared cache is configured
+            self.backend = RedisBackend(redis.Redis.from_url(redis_url))
+        else:
+            self.backend = MemoryBackend(int(app.config.get('CACHE_MAX_ENTRIES', 1024)))
+        app.extensions['response_cache'] = self
+
+    def cached(self, *namespaces, ttl=None):
+        """Decorate a Resource.get; the result is dropped whenever one of `namespaces` is invalidated."""
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if not self.enabled or replicas.pinned():
+                    # Clients that just wrote must not be answered from an entry built on a lagging replica
+                    return f(*args, **kwargs)
+
+                generations = self.backend.generations(namespaces)
+                # Catalog versions read by conditional_get in this request; another worker's write
+                # changes them even though it cannot bump this worker's generations
+                versions = g.get('catalog_versions', {})
+                scope = '|'.join(
+                    f"{namespace}:{generation}" + (f".{versions[namespace]}" if namespace in versions else '')
+                    for namespace, generation in zip(namespaces, generations)
+                )
+                key = f"{f.__qualname__}|{scope}|{request.full_path}"
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count(hit=True)
+                    kind, data, code, headers = entry
+                    if kind == 'raw':
+                        # Pre-encoded body (e.g. from the row encoder), replayed as is
+                        return Response(data, status=code, headers=headers)
+                    return data, code, headers
+
+                self._count(hit=False)
+                result = f(*args, **kwargs)
+                if isinstance(result, Response):
+                    if result.status_code == 200 and not result.is_streamed:
+                        headers = {name: value for name, value in result.headers.items() if name != 'Content-Length'}
+                        self.backend.set(key, ['raw', result.get_data(as_text=True), 200, headers], ttl or self.default_ttl)
+                    return result
+                data, code, headers = unpack(result)
+                if code == 200:
+                    self.backend.set(key, ['data', data, code, dict(headers or {})], ttl or self.default_ttl)
+                return data, code, headers
+            return decorated
+        return decorator
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.backend.evictions,
+            "size": self.backend.size(),
+        }
+
+
+response_cache = ResponseCache()
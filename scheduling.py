@@ -0,0 +1,207 @@
+import re
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from sqlalchemy import bindparam, or_, text
+from models import db, Booking, Service
+
+# Accepted besides ISO 8601 (2026-10-20 14:30, 2026-10-20T14:30:00+03:00, ...)
+APPOINTMENT_FORMATS = (
+    '%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M', '%Y/%m/%d %H:%M',
+    '%Y-%m-%d %I:%M %p', '%d/%m/%Y %I:%M %p',
+)
+DATE_ONLY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# How booking datetimes are written in responses, like Booking.timestamp
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_appointment(value, zone=timezone.utc):
+    """Parse an appointment string into a naive datetime in `zone`, or None if it is not a date and time.
+
+    Times with an offset are converted to `zone`; naive ones are taken to be in it already.
+    """
+    value = (value or '').strip()
+    if not value or DATE_ONLY.match(value):
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        moment = None
+        for format in APPOINTMENT_FORMATS:
+            try:
+                moment = datetime.strptime(value, format)
+                break
+            except ValueError:
+                continue
+    if moment is None:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(zone).replace(tzinfo=None)
+    return moment.replace(second=0, microsecond=0)
+
+
+def format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value else None
+
+
+class Scheduler:
+    """Service appointments as [appointment_start, appointment_end) intervals.
+
+    Every appointment time is a naive wall-clock time in the business
+    timezone (BOOKING_TIMEZONE), the frame opening hours are given in;
+    times sent with an offset are converted to it. Bookings that are not
+    cancelled block their interval. No booking may
+    last longer than `max_minutes`, so any booking overlapping an interval
+    starts at most that long before it. Every overlap query is therefore a
+    short range scan of the (service_id, appointment_start) index, however
+    long the service's history is. Lowering BOOKING_MAX_MINUTES below the
+    length of existing bookings would hide them from these checks.
+    """
+
+    def __init__(self, app=None):
+        self.slot_minutes = 60
+        self.max_minutes = 8 * 60
+        self.open_hour = 8
+        self.close_hour = 18
+        self.horizon_days = 90
+        self.timezone = timezone.utc
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slot_minutes = int(app.config.get('BOOKING_SLOT_MINUTES', self.slot_minutes))
+        self.max_minutes = int(app.config.get('BOOKING_MAX_MINUTES', self.max_minutes))
+        self.open_hour = int(app.config.get('BOOKING_OPEN_HOUR', self.open_hour))
+        self.close_hour = int(app.config.get('BOOKING_CLOSE_HOUR', self.close_hour))
+        self.horizon_days = int(app.config.get('BOOKING_HORIZON_DAYS', self.horizon_days))
+        self.timezone = ZoneInfo(app.config.get('BOOKING_TIMEZONE') or 'UTC')
+        app.extensions['scheduler'] = self
+
+    @property
+    def step(self):
+        return timedelta(minutes=self.slot_minutes)
+
+    def length(self, duration=None):
+        """Validated booking length for `duration` minutes (default: one slot); raises ValueError."""
+        minutes = self.slot_minutes if duration is None else duration
+        if not 0 < minutes <= self.max_minutes:
+            raise ValueError(f"duration must be between 1 and {self.max_minutes} minutes")
+        return timedelta(minutes=minutes)
+
+    def parse(self, value):
+        """parse_appointment() in the business timezone."""
+        return parse_appointment(value, self.timezone)
+
+    def now(self):
+        """The current wall-clock time in the business timezone, to the minute."""
+        return datetime.now(self.timezone).replace(tzinfo=None, second=0, microsecond=0)
+
+    def check_range(self, moment):
+        """Raise ValueError for times so close to datetime.min/max that the interval arithmetic would overflow."""
+        margin = timedelta(days=self.horizon_days + 2, minutes=self.max_minutes)
+        if not datetime.min + margin <= moment <= datetime.max - margin:
+            raise ValueError("appointment is out of range")
+        return moment
+
+    def interval(self, appointment, duration=None):
+        """(start, end) of an appointment string lasting `duration` minutes; raises ValueError."""
+        start = self.parse(appointment)
+        if start is None:
+            raise ValueError("appointment must be a date and time, e.g. 2026-10-20 14:30")
+        self.check_range(start)
+        return start, start + self.length(duration)
+
+    def lock(self, *service_ids):
+        """Lock the services until commit, so their bookings are checked and written one writer at a time.
+
+        Postgres row-locks them (SELECT ... FOR UPDATE). SQLite ignores FOR
+        UPDATE, so there a no-op UPDATE takes the database write lock instead;
+        that serializes every writer until commit, which SQLite does anyway.
+        """
+        if db.session.get_bind().dialect.name == 'sqlite':
+            statement = text("UPDATE services SET id = id WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+            db.session.execute(statement, {'ids': list(service_ids)})
+            return
+        # Always in id order, so two writers locking overlapping sets cannot deadlock
+        query = db.session.query(Service.id).filter(Service.id.in_(service_ids)).order_by(Service.id)
+        return query.with_for_update().all()
+
+    def _blocking(self, service_id, start, end):
+        """Query of (id, start, end) of the service's blocking bookings overlapping [start, end), by start."""
+        return (
+            db.session.query(Booking.id, Booking.appointment_start, Booking.appointment_end)
+            .filter(
+                Booking.service_id == service_id,
+                Booking.appointment_start > start - timedelta(minutes=self.max_minutes),
+                Booking.appointment_start < end,
+                Booking.appointment_end > start,
+                or_(Booking.status.is_(None), Booking.status != 'cancelled'),
+            )
+            .order_by(Booking.appointment_start)
+        )
+
+    def conflicts(self, service_id, start, end, exclude=None, limit=10):
+        """Ids of the service's bookings that overlap [start, end), other than `exclude`."""
+        query = self._blocking(service_id, start, end)
+        if exclude is not None:
+            query = query.filter(Booking.id != exclude)
+        if limit is not None:
+            query = query.limit(limit)
+        return [id for id, _, _ in query]
+
+    def _opening(self, day):
+        return datetime.combine(day, time(self.open_hour)), datetime.combine(day, time(self.close_hour))
+
+    def day_slots(self, service_id, day, duration=None):
+        """The slots of `day` ({start, end, available}) on the slot grid, from one range read."""
+        length = self.length(duration)
+        opens, closes = self._opening(day)
+        self.check_range(opens)
+        busy = [(start, end) for _, start, end in self._blocking(service_id, opens, closes)]
+        slots = []
+        start = opens
+        while start + length <= closes:
+            end = start + length
+            slots.append({
+                'start': format_datetime(start),
+                'end': format_datetime(end),
+                'available': not any(busy_start < end and busy_end > start for busy_start, busy_end in busy),
+            })
+            start += self.step
+        return slots
+
+    def _align(self, moment, length):
+        """First slot start at or after `moment` where `length` fits before closing time."""
+        day = moment.date()
+        while True:
+            opens, closes = self._opening(day)
+            candidate = opens if moment <= opens else opens + -(-(moment - opens) // self.step) * self.step
+            if candidate + length <= closes:
+                return candidate
+            day += timedelta(days=1)
+            moment = opens + timedelta(days=1)
+
+    def next_free_slot(self, service_id, after, duration=None):
+        """Earliest free slot of `duration` minutes at or after `after`, or None within the horizon.
+
+        Walks the service's bookings from `after` in start order, jumping past
+        each one that is in the way, so the cost grows with the bookings
+        passed over rather than with the service's history.
+        """
+        length = self.length(duration)
+        self.check_range(after)
+        opens, closes = self._opening(after.date())
+        if length > closes - opens:
+            return None
+        horizon = after + timedelta(days=self.horizon_days)
+        candidate = self._align(after, length)
+        bookings = self._blocking(service_id, candidate, horizon).yield_per(500)
+        for _, start, end in bookings:
+            if start >= candidate + length:
+                break
+            if end > candidate:
+                candidate = self._align(end, length)
+        return candidate if candidate + length <= horizon else None
+
+
+scheduler = Scheduler()
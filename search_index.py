@@ -0,0 +1,226 @@
+import re
+from functools import reduce
+from sqlalchemy import Column, Integer, MetaData, Table, Text, event, func, literal, literal_column, select, text, union_all
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from models import db, Product, Service
+
+SEARCH_MODELS = {'products': Product, 'services': Service}
+
+# Indexed columns and their relative weights: a name hit counts most, a description hit least
+SEARCH_WEIGHTS = (('name', 10.0), ('category_name', 4.0), ('subcategory_name', 4.0), ('description', 1.0))
+
+# Query words are split the way FTS5's unicode61 tokenizer splits text: runs of letters and digits
+TOKEN = re.compile(r'[^\W_]+')
+MAX_QUERY_TOKENS = 8
+# A one-letter prefix would match most of the catalog; the FTS5 prefix indexes start at two
+MIN_PREFIX_LENGTH = 2
+
+# <kind>_search plus the FTS5 shadow tables behind it
+SEARCH_TABLE = re.compile(r'^(products|services)_search(_\w+)?$')
+
+
+def query_tokens(query):
+    """Lower-cased words of a search query, at most MAX_QUERY_TOKENS of them."""
+    return TOKEN.findall((query or '').lower())[:MAX_QUERY_TOKENS]
+
+
+class SqliteSearch:
+    """One FTS5 table per catalog whose rowid is the item id; it keeps its own copy of the text."""
+
+    def __init__(self):
+        metadata = MetaData()
+        self.tables = {
+            kind: Table(
+                f"{kind}_search", metadata,
+                Column('rowid', Integer, primary_key=True),
+                *[Column(name, Text) for name, _ in SEARCH_WEIGHTS],
+            )
+            for kind in SEARCH_MODELS
+        }
+
+    def create_ddl(self, kind):
+        columns = ', '.join(name for name, _ in SEARCH_WEIGHTS)
+        # The prefix indexes answer 2 and 3 character autocomplete lookups without scanning terms
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {kind}_search USING fts5("
+            f"{columns}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ]
+
+    def drop_ddl(self, kind):
+        return [f"DROP TABLE IF EXISTS {kind}_search"]
+
+    def insert(self, kind, criteria):
+        model, search = SEARCH_MODELS[kind], self.tables[kind]
+        documents = select(model.id, *[func.coalesce(getattr(model, name), '') for name, _ in SEARCH_WEIGHTS])
+        db.session.execute(search.insert().from_select(list(search.c.keys()), documents.where(*criteria)))
+
+    def delete(self, kind, ids=None):
+        search = self.tables[kind]
+        statement = search.delete()
+        if ids is not None:
+            statement = statement.where(search.c.rowid.in_(ids))
+        db.session.execute(statement)
+
+    def optimize(self, kind):
+        # Merges the segments a bulk load leaves behind into one b-tree
+        db.session.execute(text(f"INSERT INTO {kind}_search ({kind}_search) VALUES ('optimize')"))
+
+    def query(self, tokens, prefix, names_only):
+        terms = ' '.join(f'"{token}"' for token in tokens) + ('*' if prefix else '')
+        return f"name : ({terms})" if names_only else terms
+
+    def matches(self, kind, query):
+        search = self.tables[kind]
+        table = literal_column(search.name)
+        # bm25() is lower for better matches; negated so both backends rank descending
+        rank = -func.bm25(table, *[weight for _, weight in SEARCH_WEIGHTS])
+        return (
+            select(literal(kind).label('kind'), search.c.rowid.label('id'), rank.label('score'))
+            .where(table.op('MATCH')(query))
+        )
+
+
+class PostgresSearch:
+    """One table of weighted tsvector documents per catalog behind a GIN index, keyed by item id."""
+
+    # ts_rank_cd weighs A/B/C/D labels 1.0/0.4/0.2/0.1 by default
+    LABELS = {'name': 'A', 'category_name': 'B', 'subcategory_name': 'B', 'description': 'D'}
+    CONFIG = literal_column("'simple'::regconfig")  # No stemming or stop words, like unicode61
+
+    def __init__(self):
+        metadata = MetaData()
+        self.tables = {
+            kind: Table(
+                f"{kind}_search", metadata,
+                Column('id', Integer, primary_key=True),
+                Column('document', TSVECTOR, nullable=False),
+            )
+            for kind in SEARCH_MODELS
+        }
+
+    def create_ddl(self, kind):
+        return [
+            f"CREATE TABLE IF NOT EXISTS {kind}_search ("
+            f"id integer PRIMARY KEY REFERENCES {kind} (id) ON DELETE CASCADE, document tsvector NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS ix_{kind}_search_document ON {kind}_search USING gin (document)",
+        ]
+
+    def drop_ddl(self, kind):
+        return [f"DROP TABLE IF EXISTS {kind}_search"]
+
+    def insert(self, kind, criteria):
+        model, search = SEARCH_MODELS[kind], self.tables[kind]
+        document = reduce(lambda left, right: left.op('||')(right), [
+            func.setweight(func.to_tsvector(self.CONFIG, func.coalesce(getattr(model, name), '')), label)
+            for name, label in self.LABELS.items()
+        ])
+        db.session.execute(search.insert().from_select(['id', 'document'], select(model.id, document).where(*criteria)))
+
+    def delete(self, kind, ids=None):
+        search = self.tables[kind]
+        statement = search.delete()
+        if ids is not None:
+            statement = statement.where(search.c.id.in_(ids))
+        db.session.execute(statement)
+
+    def optimize(self, kind):
+        db.session.execute(text(f"ANALYZE {kind}_search"))
+
+    def query(self, tokens, prefix, names_only):
+        # 'word':A only matches the word where it is labelled A (in the name); 'word':* is a prefix
+        weight = 'A' if names_only else ''
+        flags = [weight] * (len(tokens) - 1) + [('*' if prefix else '') + weight]
+        return ' & '.join(f"'{token}':{flag}" if flag else f"'{token}'" for token, flag in zip(tokens, flags))
+
+    def matches(self, kind, query):
+        search = self.tables[kind]
+        tsquery = func.to_tsquery(self.CONFIG, query)
+        return (
+            select(literal(kind).label('kind'), search.c.id.label('id'), func.ts_rank_cd(search.c.document, tsquery).label('score'))
+            .where(search.c.document.op('@@')(tsquery))
+        )
+
+
+class SearchIndex:
+    """Full-text index over the catalogs' name, category, subcategory and description.
+
+    SQLite keeps an FTS5 table per catalog, Postgres a table of weighted
+    tsvectors behind a GIN index. Writers update the index in the same
+    transaction as the rows, so a committed change is searchable at once
+    and a rolled back one never is. Results are ranked by bm25/ts_rank_cd
+    with name hits weighted highest.
+    """
+
+    def __init__(self):
+        self.backends = {'sqlite': SqliteSearch(), 'postgresql': PostgresSearch()}
+
+    def backend(self):
+        name = db.session.get_bind().dialect.name
+        if name not in self.backends:
+            raise RuntimeError(f"Full-text search is not supported on {name}")
+        return self.backends[name]
+
+    def index(self, kind, *items):
+        """(Re)index ORM instances of `kind`; call before committing the change to them."""
+        db.session.flush()  # Assigns ids to new rows and writes the values being indexed
+        self.refresh(kind, SEARCH_MODELS[kind].id.in_([item.id for item in items]))
+
+    def refresh(self, kind, *criteria):
+        """Reindex the rows of `kind` matching `criteria`, in the caller's transaction."""
+        backend = self.backend()
+        backend.delete(kind, select(SEARCH_MODELS[kind].id).where(*criteria))
+        backend.insert(kind, criteria)
+
+    def remove(self, kind, *ids):
+        """Drop items of `kind` from the index; call alongside deleting the rows."""
+        self.backend().delete(kind, ids)
+
+    def rebuild(self, *kinds):
+        """Reindex every row of `kinds` (default: all catalogs) and commit."""
+        backend = self.backend()
+        for kind in kinds or SEARCH_MODELS:
+            backend.delete(kind)
+            backend.insert(kind, ())
+            backend.optimize(kind)
+        db.session.commit()
+
+    def search(self, kinds, tokens, limit, offset=0, prefix=True, names_only=False):
+        """Return [(kind, id, score), ...] best first for the query words.
+
+        With `prefix` the last word also matches longer words (search as you
+        type); `names_only` restricts matching to item names.
+        """
+        backend = self.backend()
+        query = backend.query(tokens, prefix and len(tokens[-1]) >= MIN_PREFIX_LENGTH, names_only)
+        matches = [backend.matches(kind, query) for kind in kinds]
+        statement = matches[0] if len(matches) == 1 else union_all(*matches)
+        statement = statement.order_by(literal_column('score').desc(), literal_column('kind'), literal_column('id'))
+        return db.session.execute(statement.limit(limit).offset(offset)).all()
+
+    @staticmethod
+    def include_object(object, name, type_, reflected, compare_to):
+        # The search tables are created here rather than from the models; keep autogenerate away from them
+        return not (type_ == 'table' and SEARCH_TABLE.match(name))
+
+
+search_index = SearchIndex()
+
+
+def _listen(kind, model):
+    # db.create_all()/drop_all() create and drop the search table along with its catalog table
+    def create(target, connection, **kw):
+        backend = search_index.backends.get(connection.dialect.name)
+        for ddl in backend.create_ddl(kind) if backend else ():
+            connection.exec_driver_sql(ddl)
+
+    def drop(target, connection, **kw):
+        backend = search_index.backends.get(connection.dialect.name)
+        for ddl in backend.drop_ddl(kind) if backend else ():
+            connection.exec_driver_sql(ddl)
+
+    event.listen(model.__table__, 'after_create', create)
+    event.listen(model.__table__, 'before_drop', drop)
+
+
+for _kind, _model in SEARCH_MODELS.items():
+    _listen(_kind, _model)
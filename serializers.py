@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, make_response
+from metrics import metrics
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+
+def dumps(obj):
+    """Encode `obj` as JSON bytes, using orjson when it is installed."""
+    started = time.perf_counter()
+    if orjson is not None:
+        encoded = orjson.dumps(obj)
+    else:
+        encoded = json.dumps(obj, separators=(',', ':')).encode()
+    metrics.serialized(time.perf_counter() - started)
+    return encoded
+
+
+def loads(data):
+    """Decode JSON bytes or text; raises ValueError on malformed input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def output_json(data, code, headers=None):
+    """flask-restful representation for application/json built on `dumps`."""
+    resp = make_response(dumps(data) + b'\n', code)
+    resp.headers.extend(headers or {})
+    resp.mimetype = 'application/json'
+    return resp
+
+
+def json_response(body, code=200, headers=None):
+    """Wrap already encoded JSON bytes in a response."""
+    return Response(body + b'\n', status=code, headers=headers, mimetype='application/json')
+
+
+class RowEncoder:
+    """Encodes selected row tuples to JSON, reusing the bytes of rows whose version did not change.
+
+    Entries are keyed by (table, fields, id, version), so any write that
+    bumps the row version simply stops hitting the old entry, and writes to
+    other rows leave it alone. This relies on ids never being reused after a
+    delete (the catalog tables use AUTOINCREMENT on SQLite).
+    """
+
+    def __init__(self, max_rows=50000):
+        self.max_rows = max_rows
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, table, fields, rows):
+        """Encode `rows` (which must carry `id` and `version`) as a JSON array of `fields`."""
+        parts = []
+        for row in rows:
+            key = (table, fields, row.id, row.version)
+            with self._lock:
+                encoded = self._rows.get(key)
+                if encoded is not None:
+                    self._rows.move_to_end(key)
+            if encoded is None:
+                encoded = dumps({field: getattr(row, field) for field in fields})
+                with self._lock:
+                    self._rows[key] = encoded
+                    while len(self._rows) > self.max_rows:
+                        self._rows.popitem(last=False)
+            parts.append(encoded)
+        return b'[' + b','.join(parts) + b']'
+
+
+row_encoder = RowEncoder()
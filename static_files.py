@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from whitenoise import WhiteNoise
+from whitenoise.compress import Compressor
+from whitenoise.string_utils import decode_path_info
+
+# name.<12 hex>.ext, as written by build_static()
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+MANIFEST_NAME = 'staticfiles.json'
+
+
+class MediaWhiteNoise(WhiteNoise):
+    """WhiteNoise for the static folder plus the content-addressed upload store.
+
+    Static files are scanned at startup as usual. Uploads arrive while the
+    app runs, so they are looked up on their first request and remembered
+    from then on; their keys are content hashes, so an entry never goes
+    stale. Uploads and hashed static names are served with
+    `Cache-Control: immutable`; WhiteNoise handles ETags, Range requests and
+    the .br/.gz variants written by build_static().
+    """
+
+    def __init__(self, application, root=None, prefix=None, upload_root=None, upload_prefix='/uploads/', **kwargs):
+        self.upload_root = os.path.abspath(upload_root) + os.sep if upload_root else None
+        self.upload_prefix = upload_prefix
+        super().__init__(application, root, prefix, **kwargs)
+
+    def __call__(self, environ, start_response):
+        path = decode_path_info(environ.get('PATH_INFO', ''))
+        static_file = self.files.get(path)
+        if static_file is None and self.upload_root and path.startswith(self.upload_prefix):
+            static_file = self.find_upload(path)
+        if static_file is None:
+            return self.application(environ, start_response)
+        return self.serve(static_file, environ, start_response)
+
+    def find_upload(self, url):
+        relative = url[len(self.upload_prefix):]
+        # Never expose in-flight spools (.incoming/, *.part)
+        if not self.url_is_canonical(url) or relative.startswith('.') or '/.' in relative or url.endswith('.part'):
+            return None
+        path = os.path.join(self.upload_root, relative)
+        if not os.path.isfile(path):
+            return None
+        static_file = self.get_static_file(path, url)
+        self.files[url] = static_file
+        return static_file
+
+    def immutable_file_test(self, path, url):
+        return url.startswith(self.upload_prefix) or HASHED_NAME.search(url) is not None
+
+
+def build_static(root):
+    """Write content-hashed copies and .br/.gz encodings of every static file, plus the name manifest."""
+    compressor = Compressor(quiet=True)
+    manifest = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            if name == MANIFEST_NAME or HASHED_NAME.search(name) or name.endswith(('.br', '.gz')):
+                continue
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:12]
+            stem, extension = os.path.splitext(name)
+            manifest[name] = f"{stem}.{digest}{extension}"
+            hashed_path = os.path.join(root, manifest[name])
+            if not os.path.exists(hashed_path):
+                shutil.copy2(path, hashed_path)
+            for target in (path, hashed_path):
+                if compressor.should_compress(target):
+                    list(compressor.compress(target))
+    with open(os.path.join(root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
@@ -0,0 +1,39 @@
+from flask import Response, request, stream_with_context
+from serializers import dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """True when the client asked for newline-delimited JSON (?format=ndjson or Accept header)."""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _json_list(key, items):
+    # Emits {"<key>": [item, item, ...]} one item at a time
+    yield b'{' + dumps(key) + b':['
+    first = True
+    for item in items:
+        yield (b'' if first else b',') + dumps(item)
+        first = False
+    yield b']}\n'
+
+
+def _ndjson(items):
+    for item in items:
+        yield dumps(item) + b'\n'
+
+
+def stream_items(key, items, headers=None):
+    """Stream an iterable of dicts as `{key: [...]}` JSON, or NDJSON if the client asked for it.
+
+    `items` is consumed lazily inside the request context, so a generator
+    backed by a `yield_per` query never holds the full result in memory.
+    """
+    if wants_ndjson():
+        body, mimetype = _ndjson(items), NDJSON_MIMETYPE
+    else:
+        body, mimetype = _json_list(key, items), 'application/json'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
@@ -0,0 +1,125 @@
+from collections import Counter
+from sqlalchemy import bindparam, func, select
+from db_utils import upsert
+from models import db, Category, Subcategory, Product, Service
+
+CATALOG_MODELS = {'products': Product, 'services': Service}
+
+# Subcategory column counting the items of each catalog
+COUNT_COLUMNS = {'products': 'product_count', 'services': 'service_count'}
+
+
+def resolve_categories(pairs):
+    """Map (category_name, subcategory_name) pairs to (category_id, subcategory_id), creating missing nodes.
+
+    Runs in the caller's transaction; a node created for a write that is
+    rolled back disappears with it.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    # Looking nodes up must not flush the half-updated item being assigned
+    with db.session.no_autoflush:
+        names = {category for category, _ in pairs}
+        categories = dict(db.session.query(Category.name, Category.id).filter(Category.name.in_(names)))
+        missing = names - categories.keys()
+        if missing:
+            # ON CONFLICT: another writer may create the same node meanwhile
+            upsert(Category.__table__, [{'name': name} for name in missing], ['name'], {'name': lambda excluded: excluded.name})
+            categories.update(db.session.query(Category.name, Category.id).filter(Category.name.in_(missing)))
+
+        wanted = {(categories[category], subcategory) for category, subcategory in pairs}
+        lookup = lambda: db.session.query(Subcategory.category_id, Subcategory.name, Subcategory.id).filter(
+            Subcategory.category_id.in_({category_id for category_id, _ in wanted}),
+            Subcategory.name.in_({name for _, name in wanted}),
+        )
+        subcategories = {(category_id, name): id for category_id, name, id in lookup()}
+        missing = wanted - subcategories.keys()
+        if missing:
+            upsert(
+                Subcategory.__table__,
+                [{'category_id': category_id, 'name': name, 'product_count': 0, 'service_count': 0} for category_id, name in missing],
+                ['category_id', 'name'],
+                {'name': lambda excluded: excluded.name},
+            )
+            subcategories = {(category_id, name): id for category_id, name, id in lookup()}
+
+    return {
+        (category, subcategory): (categories[category], subcategories[(categories[category], subcategory)])
+        for category, subcategory in pairs
+    }
+
+
+def move_category_counts(kind, moves):
+    """Apply (old_subcategory_id, new_subcategory_id) moves of `kind` items to the counts.
+
+    None stands for "not counted": (None, id) is a new item, (id, None) a
+    deleted one. Runs in the caller's transaction.
+    """
+    deltas = Counter()
+    for old, new in moves:
+        if old != new:
+            deltas[old] -= 1
+            deltas[new] += 1
+    table = Subcategory.__table__
+    column = table.c[COUNT_COLUMNS[kind]]
+    params = [{'node_id': id, 'delta': delta} for id, delta in deltas.items() if id is not None and delta]
+    if params:
+        statement = table.update().where(table.c.id == bindparam('node_id')).values({column: column + bindparam('delta')})
+        db.session.execute(statement, params)
+
+
+def assign_category(kind, item):
+    """Point `item` at the nodes named by its category_name/subcategory_name, moving its count if they changed."""
+    category_id, subcategory_id = resolve_categories([(item.category_name, item.subcategory_name)])[
+        (item.category_name, item.subcategory_name)
+    ]
+    move_category_counts(kind, [(item.subcategory_id, subcategory_id)])
+    item.category_id, item.subcategory_id = category_id, subcategory_id
+
+
+def release_category(kind, item):
+    """Take a deleted `item` out of its subcategory's count."""
+    move_category_counts(kind, [(item.subcategory_id, None)])
+
+
+def recount_categories(*kinds):
+    """Recompute the counts of `kinds` (default: both catalogs) from the catalog tables, after bulk loads."""
+    table = Subcategory.__table__
+    for kind in kinds or CATALOG_MODELS:
+        model = CATALOG_MODELS[kind]
+        counted = select(func.count()).where(model.subcategory_id == table.c.id).scalar_subquery()
+        db.session.execute(table.update().values({COUNT_COLUMNS[kind]: counted}))
+
+
+def category_tree(include_empty=False):
+    """Categories with their subcategories and per-node product/service counts, in name order.
+
+    One read of the subcategory nodes; a category's counts are the sums of
+    its subcategories', since every item sits in exactly one subcategory.
+    """
+    rows = (
+        db.session.query(
+            Category.id, Category.name,
+            Subcategory.id.label('subcategory_id'), Subcategory.name.label('subcategory_name'),
+            Subcategory.product_count, Subcategory.service_count,
+        )
+        .join(Subcategory, Subcategory.category_id == Category.id)
+        .order_by(Category.name, Subcategory.name)
+    )
+    tree = []
+    for row in rows:
+        if not include_empty and not (row.product_count or row.service_count):
+            continue
+        if not tree or tree[-1]['id'] != row.id:
+            tree.append({'id': row.id, 'name': row.name, 'product_count': 0, 'service_count': 0, 'subcategories': []})
+        node = tree[-1]
+        node['product_count'] += row.product_count
+        node['service_count'] += row.service_count
+        node['subcategories'].append({
+            'id': row.subcategory_id,
+            'name': row.subcategory_name,
+            'product_count': row.product_count,
+            'service_count': row.service_count,
+        })
+    return tree
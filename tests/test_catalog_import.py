@@ -0,0 +1,70 @@
+import io
+import os
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app  # noqa: E402
+from catalog_io import CatalogImport, _csv_records  # noqa: E402
+from models import db, Product, Service  # noqa: E402
+
+
+@pytest.fixture
+def context():
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+def _import(kind, records):
+    importer = CatalogImport(kind, 100, 10)
+    for line, raw in records:
+        importer.add(line, raw)
+    importer.flush()
+    return importer.summary()
+
+
+def test_partial_ndjson_record_keeps_missing_fields(context):
+    full = {'name': 'Lamp', 'description': 'd', 'category_name': 'Home', 'subcategory_name': 'Light',
+            'price': 10, 'image_url': '/uploads/lamp.jpg'}
+    assert _import('products', [(1, full)])['upserted'] == 1
+
+    partial = {key: value for key, value in full.items() if key != 'image_url'}
+    summary = _import('products', [(1, dict(partial, price=12))])
+    assert summary['upserted'] == 1 and summary['failed'] == 0
+
+    product = Product.query.filter_by(name='Lamp').one()
+    assert product.price == 12
+    assert product.image_url == '/uploads/lamp.jpg'
+    assert product.version == 2
+
+
+def test_csv_without_image_columns_keeps_images(context):
+    service = {'name': 'Cut', 'description': 'd', 'category_name': 'Salon', 'subcategory_name': 'Hair', 'price': 3,
+               'before_service_image': '/uploads/b.jpg', 'after_service_image': '/uploads/a.jpg'}
+    _import('services', [(1, service)])
+
+    body = io.BytesIO(b'name,description,category_name,subcategory_name,price\nCut,new,Salon,Hair,4\n')
+    assert _import('services', _csv_records(body))['upserted'] == 1
+
+    stored = Service.query.filter_by(name='Cut').one()
+    assert (stored.description, stored.price) == ('new', 4)
+    assert (stored.before_service_image, stored.after_service_image) == ('/uploads/b.jpg', '/uploads/a.jpg')
+
+
+def test_present_empty_field_still_clears(context):
+    row = {'name': 'Mug', 'description': 'd', 'category_name': 'Home', 'subcategory_name': 'Kitchen',
+           'price': 5, 'image_url': '/uploads/mug.jpg'}
+    _import('products', [(1, row)])
+    _import('products', [(1, dict(row, image_url=''))])
+    assert Product.query.filter_by(name='Mug').one().image_url is None
+
+
+def test_batch_mixing_full_and_partial_records(context):
+    base = {'description': 'd', 'category_name': 'Home', 'subcategory_name': 'Light', 'price': 1}
+    _import('products', [(1, dict(base, name='A', image_url='/uploads/a.jpg')), (2, dict(base, name='B', image_url='/uploads/b.jpg'))])
+    _import('products', [(1, dict(base, name='A', price=2)), (2, dict(base, name='B', image_url=None))])
+    images = dict(db.session.query(Product.name, Product.image_url))
+    assert images == {'A': '/uploads/a.jpg', 'B': None}
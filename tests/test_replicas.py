@@ -0,0 +1,86 @@
+import time
+import pytest
+from flask import Flask, g
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, text
+from replicas import PRIMARY_COOKIE, PRIMARY_HEADER, ReplicaRouter, RoutingSession, use_replica
+import replicas as replicas_module
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'primary.sqlite'}"
+    app.config['DATABASE_REPLICA_URLS'] = [f"sqlite:///{tmp_path / 'replica.sqlite'}"]
+    db = SQLAlchemy(session_options={'class_': RoutingSession})
+    db.init_app(app)
+    router = ReplicaRouter(app)
+    monkeypatch.setattr(replicas_module, 'replicas', router)
+
+    @app.get('/read')
+    @use_replica
+    def read():
+        return {"bind": str(db.session.get_bind(clause=select(1)).url), "pinned": router.pinned()}
+
+    @app.get('/primary')
+    def primary():
+        return {"bind": str(db.session.get_bind(clause=select(1)).url)}
+
+    @app.post('/write')
+    def write():
+        db.session.execute(text("CREATE TABLE IF NOT EXISTS notes (id INTEGER PRIMARY KEY)"))
+        db.session.commit()
+        return {}
+
+    return app, str(router.engines[0].url), app.config['SQLALCHEMY_DATABASE_URI']
+
+
+def test_read_goes_to_replica_without_pin(setup):
+    app, replica_url, primary_url = setup
+    response = app.test_client().get('/read')
+    assert response.json == {"bind": replica_url, "pinned": False}
+
+
+def test_undecorated_read_stays_on_primary(setup):
+    app, replica_url, primary_url = setup
+    assert app.test_client().get('/primary').json["bind"] == primary_url
+
+
+def test_pin_cookie_sends_read_to_primary(setup):
+    app, replica_url, primary_url = setup
+    client = app.test_client()
+    client.set_cookie(PRIMARY_COOKIE, str(int(time.time()) + 60))
+    assert client.get('/read').json == {"bind": primary_url, "pinned": True}
+
+
+def test_pin_header_sends_read_to_primary(setup):
+    # Cross-origin clients that do not send cookies echo the header instead
+    app, replica_url, primary_url = setup
+    response = app.test_client().get('/read', headers={PRIMARY_HEADER: str(int(time.time()) + 60)})
+    assert response.json == {"bind": primary_url, "pinned": True}
+
+
+def test_expired_pin_is_ignored(setup):
+    app, replica_url, primary_url = setup
+    response = app.test_client().get('/read', headers={PRIMARY_HEADER: str(int(time.time()) - 1)})
+    assert response.json["bind"] == replica_url
+
+
+def test_write_pins_client(setup):
+    app, replica_url, primary_url = setup
+    client = app.test_client()
+    response = client.post('/write')
+    until = response.headers[PRIMARY_HEADER]
+    assert int(until) > time.time()
+    assert client.get_cookie(PRIMARY_COOKIE).value == until
+    assert client.get('/read').json["bind"] == primary_url
+
+
+def test_write_in_request_moves_later_reads_to_primary(setup):
+    app, replica_url, primary_url = setup
+    with app.test_request_context('/read'):
+        g.db_replica = True
+        session = app.extensions['sqlalchemy'].session
+        assert str(session.get_bind(clause=select(1)).url) == replica_url
+        session.get_bind(clause=text("DELETE FROM notes"))
+        assert str(session.get_bind(clause=select(1)).url) == primary_url
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+import tempfile
+from flask import Request, g, has_request_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+# <aa>/<bb>/<sha256><ext>, as returned by UploadStore.save()
+KEY_PATTERN = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+# Bodies reqparse reads form values from
+FORM_MIMETYPES = ('multipart/form-data', 'application/x-www-form-urlencoded')
+
+
+class UploadRejected(Exception):
+    """Raised for uploads whose type is not accepted."""
+
+
+class HashingSpool:
+    """Temporary file an uploaded part is streamed into, hashed chunk by chunk as it is written.
+
+    Created by werkzeug's multipart parser for every file part; writing past
+    `max_bytes` aborts the request with 413 before anything more is read.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.stored = False
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Uploaded files are limited to {self.max_bytes} bytes")
+        self.sha256.update(chunk)
+        return self.file.write(chunk)
+
+    def discard(self):
+        self.file.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read/seek/tell/readline/... go straight to the temporary file
+        return getattr(self.file, name)
+
+
+class UploadStore:
+    """Content-addressed storage for uploaded files under UPLOAD_ROOT.
+
+    A file is stored once at <root>/<aa>/<bb>/<sha256><ext>; uploading the
+    same bytes again reuses the stored copy. The key is the path relative to
+    the root; Product and Service rows hold its URL (`url(key)`), the same
+    form as the srcset variants.
+    """
+
+    def __init__(self, app=None):
+        self.root = 'uploads'
+        self.url_prefix = '/uploads/'
+        self.max_bytes = 10 * 1024 * 1024
+        self.chunk_size = 64 * 1024
+        self.allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif'}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('UPLOAD_ROOT', self.root)
+        self.url_prefix = app.config.get('UPLOAD_URL_PREFIX', self.url_prefix)
+        self.max_bytes = int(app.config.get('UPLOAD_MAX_BYTES', self.max_bytes))
+        self.chunk_size = int(app.config.get('UPLOAD_CHUNK_SIZE', self.chunk_size))
+        extensions = app.config.get('UPLOAD_ALLOWED_EXTENSIONS')
+        if extensions:
+            self.allowed_extensions = {f".{extension.strip().lower().lstrip('.')}" for extension in extensions}
+        app.request_class = UploadRequest
+        app.teardown_request(self._discard_spools)
+        app.extensions['upload_store'] = self
+
+    @property
+    def spool_dir(self):
+        # Inside the root, so the final rename never crosses filesystems
+        directory = os.path.join(self.root, '.incoming')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def spool(self):
+        spool = HashingSpool(self.spool_dir, self.max_bytes)
+        if has_request_context():
+            g.setdefault('upload_spools', []).append(spool)
+        return spool
+
+    def key(self, value):
+        """Key of a stored file's URL (or of a bare key), None for anything else."""
+        if value and value.startswith(self.url_prefix):
+            value = value[len(self.url_prefix):]
+        return value if value and KEY_PATTERN.match(value) else None
+
+    def is_stored(self, value):
+        """True for URLs or keys of files in this store (rows may still hold legacy paths or external URLs)."""
+        key = self.key(value)
+        return key is not None and os.path.isfile(self.path(key))
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def url(self, key):
+        return f"{self.url_prefix}{key}"
+
+    def save(self, file):
+        """Store an uploaded FileStorage and return its key."""
+        extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+        if extension not in self.allowed_extensions:
+            raise UploadRejected(f"File type not allowed; use one of {', '.join(sorted(self.allowed_extensions))}")
+
+        spool = file.stream
+        if not isinstance(spool, HashingSpool):
+            # Not parsed by UploadRequest (e.g. built by hand): copy it through a spool in chunks
+            spool = self.spool()
+            for chunk in iter(lambda: file.stream.read(self.chunk_size), b''):
+                spool.write(chunk)
+
+        digest = spool.sha256.hexdigest()
+        key = f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+        destination = self.path(key)
+        if not spool.stored and not os.path.exists(destination):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            spool.flush()
+            os.fsync(spool.fileno())
+            os.replace(spool.path, destination)  # Atomic: readers see the whole file or nothing
+            spool.stored = True
+        return key
+
+    def _discard_spools(self, exc=None):
+        for spool in g.pop('upload_spools', []):
+            spool.discard()
+
+
+upload_store = UploadStore()
+
+
+class UploadRequest(Request):
+    """Request that streams file parts straight into hashing spools instead of werkzeug's buffers."""
+
+    def on_json_loading_failed(self, e):
+        # reqparse reads request.json before form values; a form or multipart body is not an error here
+        if e is None and self.mimetype in FORM_MIMETYPES:
+            return None
+        return super().on_json_loading_failed(e)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_store.spool()